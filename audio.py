@@ -0,0 +1,66 @@
+# sound effects
+# every wav file under audio/ is decoded once at startup and played on reserved mixer channels,
+# each sound effect has a fixed number of channels so fast repeats (holding left or right)
+# cut off their own oldest copy instead of piling up
+
+import os, pygame
+
+# directory the sound effects are loaded from, named after the events returned by Game.step
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio")
+# most copies of one sound effect that can play at the same time
+CHANNELS_PER_SOUND = 2
+
+class SoundBank:
+    # decodes every wav file in directory and reserves channels for them
+    def __init__(self, directory=AUDIO_DIR, channels_per_sound=CHANNELS_PER_SOUND):
+        self.sounds = {}
+        for name in sorted(os.listdir(directory)):
+            if(name.endswith(".wav")):
+                self.sounds[name[:-4]] = pygame.mixer.Sound(os.path.join(directory, name))
+        # reserved channels can only be used by playing on them directly, never by Sound.play
+        total = len(self.sounds) * channels_per_sound
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+        pygame.mixer.set_reserved(total)
+        # every sound effect gets its own group of channels
+        self.channels = {}
+        for k, name in enumerate(self.sounds):
+            self.channels[name] = [pygame.mixer.Channel(k * channels_per_sound + c)
+                                   for c in range(0, channels_per_sound)]
+        # channel of every sound effect that is reused next if all of them are busy
+        self.next_channel = {name: 0 for name in self.sounds}
+
+    # plays a sound effect by name, unknown names are ignored
+    def play(self, name):
+        if(name not in self.sounds):
+            return
+        channels = self.channels[name]
+        for channel in channels:
+            if(not channel.get_busy()):
+                channel.play(self.sounds[name])
+                return
+        # every channel is busy, restart the one that has been playing longest
+        k = self.next_channel[name]
+        channels[k].play(self.sounds[name])
+        self.next_channel[name] = (k + 1) % len(channels)
+
+    # plays the sound effect for every event returned by Game.step
+    def play_events(self, events):
+        for event in events:
+            self.play(event)
+
+# sound bank that plays nothing, for headless runs or when there is no audio device
+class SilentSoundBank:
+    def play(self, name):
+        pass
+
+    def play_events(self, events):
+        pass
+
+# loads the sound bank, falling back to silence if the mixer can't be started
+def load_sound_bank():
+    try:
+        if(not pygame.mixer.get_init()):
+            pygame.mixer.init()
+        return SoundBank()
+    except pygame.error:
+        return SilentSoundBank()
@@ -0,0 +1,299 @@
+# vectorized tetris environment
+# holds N playfields as one numpy array of shape (N, height, width) and applies moves,
+# rotations, drops, locks and line clears to every board at once with array operations
+# follows the same rules as Game in engine.py: 7-bag, hold, gravity and win/loss
+
+import numpy as np
+
+from engine import ACTIONS, LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP, HARD_DROP
+from engine import TICK_MS, GRAVITY_MS, LOCK_DELAY_MS, MAX_LOCK_RESETS, LINES_TO_WIN
+from pieces import OFFSETS, KICKS, ROTATION_COUNTS
+
+# action codes for BatchTetris.step, index into engine.ACTIONS, NO_ACTION does nothing
+NO_ACTION = -1
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# (type, rotation, cell, (row, column)) offsets of every piece cell inside the 4x4 grid
+# pieces with fewer than four rotations repeat them so every type can be indexed the same way
+def build_cell_offsets():
+    offsets = np.zeros((len(OFFSETS), 4, 4, 2), dtype=np.int64)
+    for piece_type, rotations in enumerate(OFFSETS):
+        for rotation in range(0, 4):
+            for cell, (dx, dy) in enumerate(rotations[rotation % len(rotations)]):
+                offsets[piece_type, rotation, cell] = (dy, dx)
+    return offsets
+
+CELL_OFFSETS = build_cell_offsets()
+# number of distinct rotations of every piece type
+ROTATIONS = np.array(ROTATION_COUNTS, dtype=np.int64)
+
+# (type, rotation, direction, test, (dx, dy)) wall kicks from pieces.KICKS, direction 0 is
+# rotating with 1 and direction 1 with -1, shorter kick lists repeat their first test
+def build_kick_offsets():
+    tests = max(len(kicks) for piece_kicks in KICKS for kicks in piece_kicks.values())
+    offsets = np.zeros((len(KICKS), 4, 2, tests, 2), dtype=np.int64)
+    for piece_type, piece_kicks in enumerate(KICKS):
+        count = ROTATION_COUNTS[piece_type]
+        for rotation in range(0, 4):
+            start = rotation % count
+            for direction, step in enumerate((1, -1)):
+                kicks = piece_kicks[(start, (start + step) % count)]
+                for test in range(0, tests):
+                    offsets[piece_type, rotation, direction, test] = kicks[test if test < len(kicks) else 0]
+    return offsets
+
+KICK_OFFSETS = build_kick_offsets()
+
+class BatchTetris:
+    # initialize n blank playfields, each with its own 7-bag drawn from one seeded generator
+    def __init__(self, n, height=20, width=10, seed=None):
+        self.n = n
+        self.height = height
+        self.width = width
+        self.random = np.random.default_rng(seed)
+        self.boards = np.zeros((n, height, width), dtype=np.uint8)
+        self.index = np.arange(n)
+        # current piece of every board
+        self.piece_type = np.zeros(n, dtype=np.int64)
+        self.rotation = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        # hold piece of every board, -1 is no piece held
+        self.hold_piece = np.full(n, -1, dtype=np.int64)
+        self.hold_used = np.zeros(n, dtype=bool)
+        self.active = np.ones(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.pieces_placed = np.zeros(n, dtype=np.int64)
+        # number of fixed TICK_MS steps taken, all boards share the same clock
+        self.ticks = 0
+        self.gravity_timer = np.zeros(n, dtype=np.int64)
+        # how long every piece has been resting on the stack, see Game.step
+        self.lock_timer = np.zeros(n, dtype=np.int64)
+        self.lock_resets = np.zeros(n, dtype=np.int64)
+        # current bag followed by the next bag, so the next piece is always known
+        self.queue = np.concatenate([self.new_bags(n), self.new_bags(n)], axis=1)
+        self.queue_position = np.zeros(n, dtype=np.int64)
+        self.spawn(np.ones(n, dtype=bool))
+
+    # k shuffled bags of all seven pieces
+    def new_bags(self, k):
+        return self.random.permuted(np.tile(np.arange(7), (k, 1)), axis=1)
+
+    # type of the piece that will be spawned next on every board
+    def next_piece(self):
+        return self.queue[self.index, self.queue_position]
+
+    # masks out boards whose game has ended
+    def live(self, mask):
+        if(mask is None):
+            return self.active.copy()
+        return mask & self.active
+
+    # boolean mask with only the given boards set
+    def mask_of(self, boards):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[boards] = True
+        return mask
+
+    # (k, 4) rows and columns of the piece cells of boards k at the given positions
+    def cells(self, boards, x, y, rotation, piece_type=None):
+        if(piece_type is None):
+            piece_type = self.piece_type[boards]
+        offsets = CELL_OFFSETS[piece_type, rotation]
+        return y[:, None] + offsets[:, :, 0], x[:, None] + offsets[:, :, 1]
+
+    # whether the current piece of the given boards collides at the given positions
+    # only the selected boards are looked at, so sparse masks stay cheap
+    def collides(self, boards, x, y, rotation, piece_type=None):
+        rows, columns = self.cells(boards, x, y, rotation, piece_type)
+        outside = (rows < 0) | (rows >= self.height) | (columns < 0) | (columns >= self.width)
+        # clip so out of bounds cells can still be looked up, they already count as collisions
+        filled = self.boards[boards[:, None],
+                             np.clip(rows, 0, self.height - 1),
+                             np.clip(columns, 0, self.width - 1)] != 0
+        return (outside | filled).any(axis=1)
+
+    # takes the next piece from every masked board's bag, unless piece types are given
+    def spawn(self, mask, piece_type=None):
+        if(piece_type is None):
+            self.piece_type = np.where(mask, self.next_piece(), self.piece_type)
+            self.queue_position += mask
+            # boards that emptied their bag move on to the next one
+            finished = self.queue_position == 7
+            if(finished.any()):
+                count = int(finished.sum())
+                self.queue[finished, :7] = self.queue[finished, 7:]
+                self.queue[finished, 7:] = self.new_bags(count)
+                self.queue_position[finished] = 0
+        else:
+            self.piece_type = np.where(mask, piece_type, self.piece_type)
+        boards = np.nonzero(mask)[0]
+        self.x[boards] = (self.width - 4) // 2
+        self.y[boards] = 0
+        self.rotation[boards] = 0
+        self.hold_used[boards] = False
+        self.gravity_timer[boards] = 0
+        self.lock_timer[boards] = 0
+        self.lock_resets[boards] = 0
+        # if there is a collision, player loses, if player clears 40 lines player wins
+        blocked = self.collides(boards, self.x[boards], self.y[boards], self.rotation[boards])
+        won = self.lines_cleared[boards] >= LINES_TO_WIN
+        ended = boards[blocked | won]
+        self.won[boards[won]] = True
+        self.active[ended] = False
+
+    # moves every masked piece one column left (-1) or right (1) where there is room
+    def horizontal_move(self, direction, mask=None):
+        boards = np.nonzero(self.live(mask))[0]
+        moved = boards[~self.collides(boards, self.x[boards] + direction, self.y[boards],
+                                      self.rotation[boards])]
+        self.x[moved] += direction
+        self.reset_lock(moved)
+        return self.mask_of(moved)
+
+    # rotates every masked piece, kicking it like Tetris.rotate
+    # boards where every kick of the new rotation collides keep the old one
+    def rotate(self, direction, mask=None):
+        boards = np.nonzero(self.live(mask))[0]
+        # pieces with a single shape don't rotate
+        boards = boards[ROTATIONS[self.piece_type[boards]] > 1]
+        rotation = (self.rotation[boards] + direction) % ROTATIONS[self.piece_type[boards]]
+        kicks = KICK_OFFSETS[self.piece_type[boards], self.rotation[boards], 0 if direction == 1 else 1]
+        # every pass tries the next kick on the boards that haven't rotated yet
+        rotated = np.zeros(len(boards), dtype=bool)
+        for test in range(0, kicks.shape[1]):
+            waiting = np.nonzero(~rotated)[0]
+            if(len(waiting) == 0):
+                break
+            x = self.x[boards[waiting]] + kicks[waiting, test, 0]
+            y = self.y[boards[waiting]] + kicks[waiting, test, 1]
+            fits = ~self.collides(boards[waiting], x, y, rotation[waiting])
+            moved = boards[waiting[fits]]
+            self.x[moved] = x[fits]
+            self.y[moved] = y[fits]
+            self.rotation[moved] = rotation[waiting[fits]]
+            rotated[waiting[fits]] = True
+        self.reset_lock(boards[rotated])
+        return self.mask_of(boards[rotated])
+
+    # restarts the lock delay of the given boards, a limited number of times per piece
+    def reset_lock(self, boards):
+        boards = boards[(self.lock_timer[boards] > 0) & (self.lock_resets[boards] < MAX_LOCK_RESETS)]
+        self.lock_timer[boards] = 0
+        self.lock_resets[boards] += 1
+
+    # lowest row every piece can reach by dropping straight down
+    def lowest_possible(self, mask=None):
+        y = self.y.copy()
+        falling = np.nonzero(self.live(mask))[0]
+        # every pass moves all still falling pieces down one row, at most height passes
+        while(len(falling) > 0):
+            falling = falling[~self.collides(falling, self.x[falling], y[falling] + 1,
+                                             self.rotation[falling])]
+            y[falling] += 1
+        return y
+
+    # moves every masked piece down one row, pieces that can't move are locked
+    def soft_drop(self, mask=None):
+        mask = self.live(mask)
+        boards = np.nonzero(mask)[0]
+        landed = self.collides(boards, self.x[boards], self.y[boards] + 1, self.rotation[boards])
+        self.y[boards[~landed]] += 1
+        return self.lock(self.mask_of(boards[landed]))
+
+    # drops every masked piece to the bottom and locks it
+    def hard_drop(self, mask=None):
+        mask = self.live(mask)
+        self.y = np.where(mask, self.lowest_possible(mask), self.y)
+        return self.lock(mask)
+
+    # adds every masked piece to its playfield, clears lines and spawns the next piece
+    # returns the number of lines cleared on every board
+    def lock(self, mask):
+        boards = np.nonzero(mask)[0]
+        if(len(boards) > 0):
+            rows, columns = self.cells(boards, self.x[boards], self.y[boards], self.rotation[boards])
+            self.boards[boards[:, None], rows, columns] = (self.piece_type[boards] + 1)[:, None]
+        lines = self.clear_lines(mask)
+        self.pieces_placed += mask
+        self.spawn(mask)
+        return lines
+
+    # removes every full row of the masked boards in one pass
+    # returns the number of lines cleared on every board
+    def clear_lines(self, mask=None):
+        lines = np.zeros(self.n, dtype=np.int64)
+        # only the masked boards are scanned for full rows
+        if(mask is None):
+            boards = self.index
+        else:
+            boards = np.nonzero(mask)[0]
+        full = (self.boards[boards] != 0).all(axis=2)
+        lines[boards] = full.sum(axis=1)
+        cleared = lines[boards] > 0
+        boards = boards[cleared]
+        if(len(boards) > 0):
+            # stable sort puts the full rows on top and keeps the order of the other rows
+            order = np.argsort(~full[cleared], axis=1, kind="stable")
+            compacted = np.take_along_axis(self.boards[boards], order[:, :, None], axis=1)
+            # full rows that were moved to the top become empty rows
+            compacted[np.arange(self.height)[None, :] < lines[boards, None]] = 0
+            self.boards[boards] = compacted
+            self.lines_cleared += lines
+        return lines
+
+    # swaps every masked piece with its hold piece, once per piece
+    def hold(self, mask=None):
+        mask = self.live(mask) & ~self.hold_used
+        held = self.hold_piece.copy()
+        self.hold_piece = np.where(mask, self.piece_type, self.hold_piece)
+        # boards with nothing held take the next piece from the bag
+        empty = mask & (held == -1)
+        self.spawn(empty)
+        self.spawn(mask & ~empty, held)
+        self.hold_used |= mask
+        return mask
+
+    # rotates every masked piece to the given rotation, moves it to column x and hard drops it
+    # returns which boards could make the placement, the others are left untouched
+    def place(self, rotation, x, mask=None):
+        boards = np.nonzero(self.live(mask))[0]
+        rotation = np.broadcast_to(rotation, (self.n,))[boards] % ROTATIONS[self.piece_type[boards]]
+        x = np.broadcast_to(x, (self.n,))[boards]
+        fits = ~self.collides(boards, x, self.y[boards], rotation)
+        boards = boards[fits]
+        self.rotation[boards] = rotation[fits]
+        self.x[boards] = x[fits]
+        valid = self.mask_of(boards)
+        self.hard_drop(valid)
+        return valid
+
+    # applies one action code per board (NO_ACTION for none) and advances one tick
+    # returns the number of lines cleared on every board
+    def step(self, actions):
+        actions = np.asarray(actions)
+        lines = np.zeros(self.n, dtype=np.int64)
+        self.horizontal_move(-1, actions == ACTION_CODES[LEFT])
+        self.horizontal_move(1, actions == ACTION_CODES[RIGHT])
+        self.rotate(1, actions == ACTION_CODES[ROTATE_CW])
+        self.rotate(-1, actions == ACTION_CODES[ROTATE_CCW])
+        self.hold(actions == ACTION_CODES[HOLD])
+        lines += self.soft_drop(actions == ACTION_CODES[SOFT_DROP])
+        lines += self.hard_drop(actions == ACTION_CODES[HARD_DROP])
+        self.ticks += 1
+        # gravity moves pieces down but never locks them, that is left to the lock delay
+        # GRAVITY_MS is longer than a tick, so a piece falls at most one row per step
+        self.gravity_timer += TICK_MS * self.active
+        falling = np.nonzero(self.gravity_timer >= GRAVITY_MS)[0]
+        self.gravity_timer[falling] -= GRAVITY_MS
+        falling = falling[~self.collides(falling, self.x[falling], self.y[falling] + 1,
+                                         self.rotation[falling])]
+        self.y[falling] += 1
+        # lock delay
+        boards = np.nonzero(self.active)[0]
+        resting = self.mask_of(boards[self.collides(boards, self.x[boards], self.y[boards] + 1,
+                                                    self.rotation[boards])])
+        self.lock_timer = np.where(resting, self.lock_timer + TICK_MS, 0)
+        lines += self.lock(self.lock_timer >= LOCK_DELAY_MS)
+        return lines
@@ -0,0 +1,264 @@
+# benchmarks for the engine and renderer hot paths
+# every operation is timed on seeded board fixtures, so two runs on the same machine measure
+# the same work and results from two versions can be compared with --compare
+# the renderer is drawn on the dummy SDL video driver, no window is opened
+#
+# usage: python bench.py [--only engine] [--out bench.json] [--compare old.json]
+
+import argparse, gc, json, os, platform, random, sys, time, tracemalloc
+
+# make sure engine.py, boards.py, runner.py and renderer.py are in same directory for this to work
+from boards import BOARDS
+from bot import Bot
+from engine import Game
+from runner import random_policy
+
+# boards every operation is timed on
+FIXTURES = ["empty", "midgame", "near_topout", "clears"]
+# seed of every fixture and of the games measured for memory
+SEED = 0
+# timed samples per benchmark, percentiles are taken over these
+SAMPLES = 300
+# untimed calls before every benchmark
+WARMUP = 10
+# calls per sample for operations that don't change the board, so the timer overhead is spread out
+BATCH = 50
+# a result this many times slower than the compared run counts as a regression
+THRESHOLD = 1.25
+
+# plays a seeded game until stop(game) is true, with the random policy or the bot
+def play_until(board, seed, stop, policy=None):
+    game = Game(seed, board=board)
+    rng = random.Random(seed)
+    while(game.active and not stop(game)):
+        actions = policy(game) if policy != None else random_policy(game, rng)
+        placed = game.pieces_placed
+        for action in actions:
+            game.step(action)
+            if(game.pieces_placed != placed or not game.active):
+                break
+    return game
+
+# moves the current piece to (x, y) with the given rotation and locks it where it is
+def place(board, piece_type, x, y, rotation):
+    board.create_piece(piece_type)
+    board.Piece.x, board.Piece.y, board.Piece.rotation = x, y, rotation
+    board.lock()
+
+# builds the named fixture, a board with an active piece at its spawn position
+def build_fixture(name, board):
+    if(name == "empty"):
+        game = Game(SEED, board=board)
+    elif(name == "midgame"):
+        # a realistic stack built by the bot
+        bot = Bot(time_budget_ms=None)
+        game = play_until(board, SEED, lambda game: game.pieces_placed >= 40, bot.actions)
+    elif(name == "near_topout"):
+        # random play until the stack is four rows from the top, retrying with other seeds
+        seed = SEED
+        while(True):
+            game = play_until(board, seed,
+                              lambda game: max(game.board.column_heights) >= game.board.height - 4)
+            if(game.active):
+                break
+            seed += 1
+    else:
+        # four full rows except the last column, with an upright I piece above the gap
+        game = Game(SEED, board=board)
+        tetris = game.board
+        for row in range(tetris.height - 4, tetris.height):
+            for x in range(0, tetris.width - 4, 4):
+                place(tetris, 0, x, row - 1, 0)
+        for x in range(tetris.width - (tetris.width - 1) % 4 - 1, tetris.width - 1):
+            place(tetris, 0, x - 1, tetris.height - 4, 1)
+        tetris.create_piece(0)
+        tetris.Piece.x, tetris.Piece.rotation = tetris.width - 2, 1
+    return game
+
+# locks the current piece where it would land without clearing any lines,
+# leaving the full rows on the board for clear_lines to remove
+def lock_without_clearing(board):
+    board.Piece.y = board.lowest_possible()
+    # both backends end their lock with finish_lock, which is what clears the lines
+    board.finish_lock = lambda tspin: None
+    board.lock()
+    del board.finish_lock
+    board.Piece = None
+    return board
+
+# times operation(state) on a fresh state from setup() for every sample
+# returns ops/sec and percentiles of the time per call in nanoseconds
+def measure(setup, operation, samples=SAMPLES, batch=1):
+    # a few untimed calls first, so caches are warm
+    for _ in range(0, WARMUP):
+        operation(setup())
+    times = []
+    # garbage collection would land on random samples
+    gc.disable()
+    try:
+        for _ in range(0, samples):
+            state = setup()
+            start = time.perf_counter_ns()
+            for _ in range(0, batch):
+                operation(state)
+            times.append((time.perf_counter_ns() - start) / batch)
+    finally:
+        gc.enable()
+    times.sort()
+    mean = sum(times) / len(times)
+    return {
+        "ops_per_sec": 1e9 / mean if mean > 0 else None,
+        "mean_ns": mean,
+        "p50_ns": times[len(times) // 2],
+        "p90_ns": times[len(times) * 9 // 10],
+        "p99_ns": times[min(len(times) - 1, len(times) * 99 // 100)],
+        "samples": len(times) * batch
+    }
+
+# every engine benchmark on one fixture
+def engine_benchmarks(fixture, samples):
+    board = fixture.board
+    same = lambda: board
+    fresh = lambda: board.copy()
+    landed = lambda: lock_ready(board.copy())
+    results = {
+        "check_collision": measure(same, lambda b: b.check_collision(), samples, BATCH),
+        "lowest_possible": measure(same, lambda b: b.lowest_possible(), samples, BATCH),
+        "placements": measure(same, lambda b: b.placements(), samples, BATCH),
+        "rotate": measure(lambda: board.copy().Piece, lambda p: p.rotate(1), samples, BATCH),
+        "return_positions": measure(lambda: board.Piece, lambda p: p.return_positions(),
+                                    samples, BATCH),
+        "copy": measure(same, lambda b: b.copy(), samples, BATCH),
+        "hard_drop": measure(fresh, lambda b: b.hard_drop(), samples),
+        "lock": measure(landed, lambda b: b.lock(), samples),
+        "clear_lines": measure(lambda: lock_without_clearing(board.copy()),
+                               lambda b: b.clear_lines(), samples)
+    }
+    return results
+
+# moves the current piece onto the stack so it can be locked
+def lock_ready(board):
+    board.Piece.y = board.lowest_possible()
+    return board
+
+# memory of playing one seeded game with the bot: the peak includes the bot's search and caches,
+# what is retained after the bot is dropped is the game itself
+def game_memory(board):
+    tracemalloc.start()
+    start = time.perf_counter()
+    bot = Bot(time_budget_ms=None)
+    game = play_until(board, SEED, lambda game: game.pieces_placed >= 1000, bot.actions)
+    elapsed = time.perf_counter() - start
+    cache = bot.cache_stats()
+    del bot
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "pieces": game.pieces_placed,
+        "lines": game.board.lines_cleared,
+        "wall_time": elapsed,
+        "peak_bytes": peak,
+        "retained_bytes": current,
+        # hit, miss and eviction counters of the bot's caches over the game
+        "cache": cache
+    }
+
+# every draw benchmark of the renderer on one fixture, drawn on the dummy video driver
+def render_benchmarks(fixture, samples):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame, fonts
+    from renderer import Renderer, Layout
+    if(not pygame.display.get_init()):
+        pygame.display.init()
+        pygame.font.init()
+        pygame.display.set_mode(Layout(fixture.board.height, fixture.board.width).screen_size)
+        fonts.load_fonts()
+    surface = pygame.display.get_surface()
+    renderer = Renderer(surface)
+    renderer.set_session(fixture)
+    renderer.full_redraw(True)
+    # forgets what was drawn, so draw_playfield draws every row again
+    def undrawn():
+        renderer.drawn_locks = -1
+        renderer.drawn_rows = [[0] * fixture.board.width for _ in range(fixture.board.height)]
+        return renderer
+    same = lambda: renderer
+    return {
+        "draw_grid": measure(same, lambda r: r.draw_grid(surface), samples),
+        "draw_border": measure(same, lambda r: r.draw_border(surface, True), samples),
+        "draw_labels": measure(same, lambda r: r.draw_labels(surface), samples),
+        "draw_current_piece": measure(same, lambda r: r.draw_current_piece(), samples),
+        "draw_playfield": measure(undrawn, lambda r: r.draw_playfield(), samples),
+        "draw_next_piece": measure(same, lambda r: r.draw_next_piece(), samples),
+        "draw_hold_piece": measure(same, lambda r: r.draw_hold_piece(), samples),
+        "draw_text": measure(same, lambda r: r.draw_text(True), samples),
+        "full_redraw": measure(same, lambda r: r.full_redraw(True), samples),
+        "render": measure(same, lambda r: r.render(), samples)
+    }
+
+# compares two result files, returns the benchmarks that got slower than threshold
+def compare(old, new, threshold=THRESHOLD):
+    regressions = []
+    for section in ("engine", "render"):
+        for key, benchmarks in new.get(section, {}).items():
+            for name, result in benchmarks.items():
+                previous = old.get(section, {}).get(key, {}).get(name)
+                if(previous == None or previous["p50_ns"] == 0):
+                    continue
+                ratio = result["p50_ns"] / previous["p50_ns"]
+                if(ratio > threshold):
+                    regressions.append("%s %s %s: %.2fx slower" % (section, key, name, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tetris engine and renderer.")
+    parser.add_argument("--board", choices=sorted(BOARDS) + ["all"], default="all")
+    parser.add_argument("--only", choices=["engine", "render", "memory"], default=None,
+                        help="run only one group of benchmarks")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="timed samples per benchmark")
+    parser.add_argument("--out", default=None, help="write the results to this json file")
+    parser.add_argument("--compare", metavar="FILE", default=None,
+                        help="report benchmarks that got slower than in an earlier results file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    boards = sorted(BOARDS) if args.board == "all" else [args.board]
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": SEED,
+        "engine": {},
+        "render": {},
+        "memory": {}
+    }
+    for board_name in boards:
+        board = BOARDS[board_name]
+        for fixture_name in FIXTURES:
+            key = board_name + "/" + fixture_name
+            fixture = build_fixture(fixture_name, board)
+            if(args.only in (None, "engine")):
+                results["engine"][key] = engine_benchmarks(fixture, args.samples)
+            # drawing doesn't depend on the backend, one is enough
+            if(args.only in (None, "render") and board_name == boards[0]):
+                results["render"][fixture_name] = render_benchmarks(fixture, args.samples)
+        if(args.only in (None, "memory")):
+            results["memory"][board_name] = game_memory(board)
+
+    output = json.dumps(results, indent=2)
+    if(args.out != None):
+        with open(args.out, "w") as out_file:
+            out_file.write(output + "\n")
+    else:
+        print(output)
+    if(args.compare != None):
+        with open(args.compare) as old_file:
+            regressions = compare(json.load(old_file), results, args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if(len(regressions) > 0):
+            raise SystemExit("%d benchmarks regressed" % len(regressions))
+
+if __name__ == "__main__":
+    main()
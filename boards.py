@@ -0,0 +1,8 @@
+# playfield backends by the name they are picked with on the command line
+# they all play out the same, bench.py measures how fast each one is
+
+from engine import Tetris
+
+BOARDS = {
+    "list": Tetris
+}
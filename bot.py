@@ -0,0 +1,200 @@
+# placement bot
+# scores boards with a heuristic evaluator and beam searches over the placements of the
+# current piece, the hold piece and the preview, then turns the best placement into actions
+# the evaluator only reads the column heights and cell counts the board keeps up to date,
+# it never scans the playfield, so thousands of candidate boards can be scored per piece
+# evaluations and placements are cached by zobrist hash, since the same boards come up again
+# through other move orders and in the search for the next piece
+
+import time
+
+from cache import LRUCache
+from engine import LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, HARD_DROP
+
+# weight of every evaluator feature, higher scores are better
+WEIGHTS = {
+    # sum of the column heights
+    "height": -0.51,
+    # empty cells with a filled cell somewhere above them
+    "holes": -0.36,
+    # sum of the height differences between neighbouring columns
+    "bumpiness": -0.18,
+    # sum of how far every column is below both of its neighbours
+    "wells": -0.1,
+    # lines cleared on the way to the board
+    "lines": 0.76
+}
+# number of boards kept at every depth of the search
+BEAM_WIDTH = 8
+# number of upcoming pieces the bot looks at, the game shows one
+PREVIEW = 1
+# time the search may take per piece, after that the best placement found so far is used
+TIME_BUDGET_MS = 50
+# entries kept in each of the bot's caches
+CACHE_SIZE = 65536
+
+# every evaluator feature of a board except lines, from its column heights and cell counts
+def features(board):
+    heights = board.column_heights
+    height = sum(heights)
+    holes = height - sum(board.column_cells)
+    bumpiness = 0
+    wells = 0
+    for column in range(0, board.width):
+        # walls are as high as the board
+        left = heights[column - 1] if column > 0 else board.height
+        right = heights[column + 1] if column < board.width - 1 else board.height
+        if(column > 0):
+            bumpiness += abs(heights[column] - left)
+        wells += max(0, min(left, right) - heights[column])
+    return {"height": height, "holes": holes, "bumpiness": bumpiness, "wells": wells}
+
+# heuristic score of a board after clearing lines to reach it
+def evaluate(board, lines, weights=WEIGHTS):
+    score = weights["lines"] * lines
+    for name, value in features(board).items():
+        score += weights[name] * value
+    return score
+
+# one board reached during the search
+class Node:
+    def __init__(self, board, current, hold, position, hold_allowed, lines, first):
+        self.board = board
+        # type of the piece to place next, None when the search has run out of known pieces
+        self.current = current
+        self.hold = hold
+        # index of the next piece in the queue
+        self.position = position
+        self.hold_allowed = hold_allowed
+        # lines cleared on the way here
+        self.lines = lines
+        # the placement of the game's current piece this board started from:
+        # (whether to hold first, spawn x, x, rotation)
+        self.first = first
+        self.score = 0
+
+class Bot:
+    # initialize with the evaluator weights, the search width and depth and the time budget
+    # time_budget_ms=None searches the whole beam every time, which makes the bot deterministic
+    def __init__(self, weights=WEIGHTS, beam_width=BEAM_WIDTH, preview=PREVIEW,
+                 time_budget_ms=TIME_BUDGET_MS, cache_size=CACHE_SIZE):
+        self.weights = weights
+        self.beam_width = beam_width
+        self.preview = preview
+        self.time_budget_ms = time_budget_ms
+        # number of boards evaluated, for measuring search speed
+        self.evaluated = 0
+        # board hash -> evaluation without lines
+        self.evaluations = LRUCache(cache_size)
+        # (board hash, piece type) -> placements of the piece from its spawn position
+        self.placements = LRUCache(cache_size)
+
+    # hit, miss and eviction counters of both caches
+    def cache_stats(self):
+        return {"evaluations": self.evaluations.stats(), "placements": self.placements.stats()}
+
+    # evaluation of a board reached by clearing lines, from the cache if the board was seen before
+    def score(self, board, lines):
+        value = self.evaluations.get(board.hash)
+        if(value == None):
+            value = evaluate(board, 0, self.weights)
+            self.evaluations.put(board.hash, value)
+        return value + self.weights["lines"] * lines
+
+    # placements of the board's current piece, which has to be at its spawn position
+    def spawn_placements(self, board):
+        key = (board.hash, board.Piece.type)
+        placements = self.placements.get(key)
+        if(placements == None):
+            placements = board.placements()
+            self.placements.put(key, placements)
+        return placements
+
+    # every board the node's piece (or, holding, the hold or next piece) can be placed on
+    def expand(self, node, queue):
+        children = []
+        if(node.current == None):
+            return children
+        # (piece to place, hold afterwards, next queue position, held)
+        options = [(node.current, node.hold, node.position, False)]
+        if(node.hold_allowed and node.hold != node.current):
+            if(node.hold == None):
+                # with nothing held, holding brings in the next piece
+                if(node.position < len(queue)):
+                    options.append((queue[node.position], node.current, node.position + 1, True))
+            else:
+                options.append((node.hold, node.current, node.position, True))
+        board = node.board
+        for piece_type, hold, position, held in options:
+            board.create_piece(piece_type)
+            if(board.check_collision()):
+                continue
+            current = queue[position] if position < len(queue) else None
+            for x, rotation, landing in self.spawn_placements(board):
+                child = board.copy()
+                child.Piece.x, child.Piece.y, child.Piece.rotation = x, landing, rotation
+                child.lock()
+                lines = node.lines + child.last_clear.lines
+                first = node.first
+                if(first == None):
+                    first = (held, board.Piece.x, x, rotation)
+                # every piece after the first spawns with hold available again
+                child_node = Node(child, current, hold, position + 1, True, lines, first)
+                child_node.score = self.score(child, lines)
+                children.append(child_node)
+        board.Piece = None
+        self.evaluated += len(children)
+        return children
+
+    # beam searches the game's current position, returns the best first placement
+    # as (whether to hold first, spawn x, x, rotation), or None if the piece can't be placed
+    def search(self, game):
+        start = time.perf_counter()
+        queue = game.queue[:self.preview]
+        board = game.board.copy()
+        board.Piece = None
+        beam = [Node(board, game.board.Piece.type, game.hold_piece, 0, not game.hold_used, 0, None)]
+        best = None
+        out_of_time = False
+        while(not out_of_time):
+            children = []
+            for node in beam:
+                children += self.expand(node, queue)
+                if(self.time_budget_ms != None and len(children) > 0
+                   and (time.perf_counter() - start) * 1000 > self.time_budget_ms):
+                    out_of_time = True
+                    break
+            if(len(children) == 0):
+                break
+            children.sort(key=lambda node: node.score, reverse=True)
+            # the same position reached through another order of placements is only kept once
+            beam = []
+            seen = set()
+            for child in children:
+                key = (child.board.hash, child.current, child.hold, child.position)
+                if(key not in seen):
+                    seen.add(key)
+                    beam.append(child)
+                    if(len(beam) == self.beam_width):
+                        break
+            best = beam[0]
+        return best.first if best != None else None
+
+    # actions that place the game's current piece where the search found best
+    def actions(self, game):
+        first = self.search(game)
+        if(first == None):
+            return [HARD_DROP]
+        held, spawn_x, x, rotation = first
+        actions = [HOLD] if held else []
+        # the turns placements checked, on the piece that is placed at its spawn position
+        board = game.board.copy()
+        piece_type = board.Piece.type
+        if(held):
+            piece_type = game.hold_piece if game.hold_piece != None else game.queue[0]
+        board.create_piece(piece_type)
+        for direction in board.rotation_path(rotation):
+            actions.append(ROTATE_CW if direction == 1 else ROTATE_CCW)
+        actions += [LEFT if x < spawn_x else RIGHT] * abs(x - spawn_x)
+        actions.append(HARD_DROP)
+        return actions
@@ -0,0 +1,56 @@
+# bounded cache for search results
+# positions are reached again and again through different move orders, results are stored by
+# a key (usually built from a board's zobrist hash) and the least recently used entry is dropped
+# once the cache is full, so memory stays flat however long the game runs
+
+from collections import OrderedDict
+
+# default number of entries kept
+CACHE_SIZE = 65536
+
+class LRUCache:
+    # initialize with the most entries to keep
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    # returns the value stored for key, or default if there is none
+    def get(self, key, default=None):
+        if(key in self.entries):
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    # stores value for key, dropping the least recently used entry if the cache is full
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if(len(self.entries) > self.size):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # removes every entry, the counters are kept
+    def clear(self):
+        self.entries.clear()
+
+    # counters for reporting how well the cache works
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0
+        }
@@ -0,0 +1,139 @@
+# keyboard input
+# turns key presses and releases into engine actions, including the auto repeat of held keys
+# every event is stamped with the game time it was read at, and repeats are worked out from
+# those times rather than counted in frames, so DAS (delay before repeating), ARR (time between
+# repeats) and the soft drop factor behave the same at any frame rate
+# ARR 0 moves a charged piece straight to the wall and an infinite soft drop factor (20G)
+# drops it straight onto the stack
+
+import math, pygame
+
+from engine import LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP, HARD_DROP
+
+# holding left or right moves once, waits DAS_MS, then repeats every ARR_MS
+DAS_MS = 167
+ARR_MS = 33
+# holding down drops the piece SDF times faster than gravity, math.inf drops it instantly
+SDF = 20
+
+# keys for every action handled while a piece is active
+KEY_ACTIONS = {
+    # clockwise rotation
+    ord('a'): ROTATE_CW,
+    # counterclockwise rotation
+    ord('s'): ROTATE_CCW,
+    # hold piece
+    ord('c'): HOLD,
+    # move piece left and right
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT,
+    # soft drop
+    pygame.K_DOWN: SOFT_DROP,
+    # hard drop
+    pygame.K_SPACE: HARD_DROP
+}
+
+class Controls:
+    # initialize with the repeat timings in milliseconds and the soft drop factor
+    def __init__(self, das_ms=DAS_MS, arr_ms=ARR_MS, sdf=SDF, keys=KEY_ACTIONS):
+        self.das_ms = das_ms
+        self.arr_ms = arr_ms
+        self.sdf = sdf
+        self.keys = keys
+        self.reset()
+
+    # forgets every held key, for a new game
+    def reset(self):
+        # held directions, the last one pressed is the one that moves
+        self.directions = []
+        # when the moving direction was pressed and how many repeats it has made
+        self.direction_time = 0
+        self.repeats = 0
+        # when down was pressed and how many rows it has dropped since, None when not held
+        self.down_time = None
+        self.drops = 0
+
+    # applies a key event read at game time now (milliseconds) to session
+    # returns the events of the applied actions, like Game.apply
+    def handle(self, event, now, session):
+        events = []
+        if(event.key not in self.keys):
+            return events
+        action = self.keys[event.key]
+        if(event.type == pygame.KEYDOWN):
+            # the press itself acts immediately, the repeats start from now
+            events += session.apply(action)
+            if(action == LEFT or action == RIGHT):
+                if(action in self.directions):
+                    self.directions.remove(action)
+                self.directions.append(action)
+                self.direction_time = now
+                self.repeats = 0
+            elif(action == SOFT_DROP):
+                self.down_time = now
+                self.drops = 0
+        elif(event.type == pygame.KEYUP):
+            # repeats that were due before the key went up still happen
+            events += self.update(session, now)
+            if(action in self.directions):
+                moving = self.directions[-1] == action
+                self.directions.remove(action)
+                # the other direction takes over if it is still held, with its own delay
+                if(moving):
+                    self.direction_time = now
+                    self.repeats = 0
+            elif(action == SOFT_DROP):
+                self.down_time = None
+        return events
+
+    # applies every repeat of the held keys that is due by game time now
+    # returns the events of the applied actions
+    def update(self, session, now):
+        events = []
+        if(not session.active or session.board.Piece == None):
+            return events
+        if(len(self.directions) > 0):
+            events += self.repeat_direction(session, now)
+        if(self.down_time != None):
+            events += self.repeat_drop(session, now)
+        return events
+
+    # auto repeat of the held direction, once DAS has passed
+    def repeat_direction(self, session, now):
+        events = []
+        held = now - self.direction_time
+        if(held < self.das_ms):
+            return events
+        direction = self.directions[-1]
+        step = -1 if direction == LEFT else 1
+        if(self.arr_ms <= 0):
+            # instant repeat: as far as the piece goes
+            due = math.inf
+        else:
+            due = 1 + int((held - self.das_ms) // self.arr_ms)
+        while(self.repeats < due):
+            piece = session.board.Piece
+            if(piece == None or not session.board.fits(piece.x + step, piece.y, piece.rotation)):
+                # against a wall, the repeats that are due are used up
+                self.repeats = due if due != math.inf else self.repeats
+                break
+            events += session.apply(direction)
+            self.repeats += 1
+        return events
+
+    # repeated soft drops while down is held, SDF times faster than gravity
+    # soft drops from holding never lock the piece, that is left to the lock delay
+    def repeat_drop(self, session, now):
+        events = []
+        if(self.sdf == math.inf):
+            due = math.inf
+        else:
+            due = int((now - self.down_time) * self.sdf // session.gravity_ms)
+        while(self.drops < due):
+            board = session.board
+            if(board.Piece == None or board.Piece.y >= board.lowest_possible()):
+                self.drops = due if due != math.inf else self.drops
+                break
+            events += session.apply(SOFT_DROP)
+            self.drops += 1
+        return events
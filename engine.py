@@ -0,0 +1,618 @@
+# headless tetris engine
+# contains all of the game rules (board, bag, hold, gravity, win/loss) with no pygame
+# dependency, so games can be simulated at full speed without a display, audio or event pump
+
+import random
+
+# make sure pieces.py is in same directory for this to work
+from pieces import Piece, OFFSETS, BOTTOMS, KICKS, ROTATION_COUNTS
+
+# actions accepted by Game.step
+LEFT = "left"
+RIGHT = "right"
+ROTATE_CW = "rotate_cw"
+ROTATE_CCW = "rotate_ccw"
+HOLD = "hold"
+SOFT_DROP = "soft_drop"
+HARD_DROP = "hard_drop"
+ACTIONS = (LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP, HARD_DROP)
+# ends the game early, like pressing R
+RESIGN = "resign"
+# lines of garbage received from another player, logged as (tick, GARBAGE, lines)
+GARBAGE = "garbage"
+
+# the simulation advances in fixed steps of TICK_MS milliseconds, independent of frame rate
+TICK_MS = 10
+# the piece falls one row every GRAVITY_MS milliseconds
+GRAVITY_MS = 1000
+# a piece resting on the stack locks after LOCK_DELAY_MS milliseconds
+LOCK_DELAY_MS = 500
+# moving or rotating a resting piece restarts the lock delay, at most this many times per piece
+MAX_LOCK_RESETS = 15
+# clearing this many lines wins the game
+LINES_TO_WIN = 40
+# points for every kind of clear, a t can't clear four lines and t-spins with no lines still score
+CLEAR_POINTS = {None: 0, "single": 100, "double": 300, "triple": 500, "tetris": 800}
+TSPIN_POINTS = {None: 400, "single": 800, "double": 1200, "triple": 1600}
+# lines of garbage sent to the other players for every kind of clear in versus games,
+# t-spins send two lines for every line they clear
+GARBAGE_LINES = {None: 0, "single": 0, "double": 1, "triple": 2, "tetris": 4}
+# playfield value of garbage cells, after the seven piece types
+GARBAGE_CELL = 8
+
+# zobrist keys: one random 64 bit number per cell, a board's hash is the xor of the keys of its
+# filled cells, so locking a piece updates it with four xors
+# the keys come from a fixed seed so hashes are the same in every process and every run
+ZOBRIST_SEED = 20210421
+zobrist_tables = {}
+
+# zobrist keys for every (row, column) of a board size, generated the first time they are needed
+def zobrist_keys(height, width):
+    if((height, width) not in zobrist_tables):
+        generator = random.Random(ZOBRIST_SEED)
+        zobrist_tables[(height, width)] = [[generator.getrandbits(64) for _ in range(width)]
+                                           for _ in range(height)]
+    return zobrist_tables[(height, width)]
+
+# index of the T piece in Piece.pieces, its centre is cell 5 of the 4x4 grid in every rotation
+T_PIECE = 5
+# cells diagonal to the centre of the T piece, as (row, column) offsets
+T_CORNERS = ((0, 0), (0, 2), (2, 0), (2, 2))
+# name of a clear by the number of lines it removed
+CLEAR_NAMES = {1: "single", 2: "double", 3: "triple", 4: "tetris"}
+
+# what happened when a piece locked: the rows it cleared and what kind of clear it was
+# returned by clear_lines so scoring, stats and drawing don't have to scan the board again
+class ClearEvent:
+    def __init__(self, rows, tspin=False):
+        # indices of the cleared rows, top to bottom, as they were before the clear
+        self.rows = tuple(rows)
+        self.lines = len(self.rows)
+        # "single", "double", "triple", "tetris", or None if no lines were cleared
+        self.kind = CLEAR_NAMES.get(self.lines)
+        # the piece was a T that rotated into place with 3 of its 4 corners blocked
+        self.tspin = tspin
+
+    def __repr__(self):
+        return "ClearEvent(rows=%r, kind=%r, tspin=%r)" % (self.rows, self.kind, self.tspin)
+
+# main class for game functionality, piece manipulation, and board features
+class Tetris:
+    # track user lines cleared
+    lines_cleared = 0
+    # default piece type is none
+    Piece = None
+    # initialize by generating blank playfield, every piece has to fit in it
+    def __init__(self, height, width):
+        if(height < 4 or width < 4):
+            raise ValueError("board must be at least 4x4, got %dx%d" % (height, width))
+        # game starts out as active, becomes deactive upon player loss
+        self.active = True
+        # playfield stores the entire tetris board
+        self.playfield = []
+        self.height = height
+        self.width = width
+        # pieces spawn in the middle of the top row, column 3 on a 10 wide board
+        self.spawn_x = (width - 4) // 2
+        for _ in range(height):
+            row = []
+            for _ in range(width):
+                row.append(0)
+            self.playfield.append(row)
+        # height of the highest filled cell of every column, kept up to date by lock and clear_lines
+        self.column_heights = [0] * width
+        # number of filled cells in every column, together with the heights this gives the holes
+        self.column_cells = [0] * width
+        # zobrist hash of which cells are filled, and the part of it from every row
+        self.cell_keys = zobrist_keys(height, width)
+        self.hash = 0
+        self.row_hashes = [0] * height
+        # whether the last thing the current piece did was rotate, for t-spins
+        self.rotated = False
+        # number of pieces locked (garbage coming in counts too), and the rows and clear of the
+        # last one, so drawing code can tell what changed without comparing the whole playfield
+        self.locks = 0
+        self.locked_rows = ()
+        self.last_clear = None
+
+    # generates piece at top of the screen, check Piece class in pieces.py
+    def create_piece(self, piece_type):
+        self.Piece = Piece(self.spawn_x, 0, piece_type)
+        self.rotated = False
+
+    # rotate piece, check Piece class in pieces.py, returns whether the piece rotated
+    # if the rotated piece collides it is kicked to the first free spot of the KICKS table
+    # a piece with a single shape (the O) never rotates, so it doesn't reset the lock delay
+    def rotate(self, direction):
+        if(ROTATION_COUNTS[self.Piece.type] == 1):
+            return False
+        start = self.Piece.rotation
+        self.Piece.rotate(direction)
+        x, y = self.Piece.x, self.Piece.y
+        for dx, dy in KICKS[self.Piece.type][(start, self.Piece.rotation)]:
+            self.Piece.x, self.Piece.y = x + dx, y + dy
+            # check for collision to make sure rotation is possible
+            if(not self.check_collision()):
+                self.rotated = True
+                return True
+        self.Piece.x, self.Piece.y = x, y
+        self.Piece.rotate(-direction)
+        return False
+
+    # check piece collision
+    def check_collision(self):
+        x, y = self.Piece.x, self.Piece.y
+        for j, i in OFFSETS[self.Piece.type][self.Piece.rotation]:
+            # collision with outside wall, kicks can also push a piece up past the top
+            if(i + y > self.height - 1 or i + y < 0 or j + x > self.width - 1 or j + x < 0):
+                return True
+            # collision with another piece in the playfield
+            if(self.playfield[i + y][j + x] > 0):
+                return True
+        # since no collisions detected, return false
+        return False
+
+    # independent copy of the board and current piece, for searching ahead without touching the game
+    def copy(self):
+        # copy.copy is slow enough to matter when the bot copies thousands of boards per piece
+        board = self.__class__.__new__(self.__class__)
+        board.__dict__.update(self.__dict__)
+        board.playfield = [row[:] for row in self.playfield]
+        board.column_heights = self.column_heights[:]
+        board.column_cells = self.column_cells[:]
+        board.row_hashes = self.row_hashes[:]
+        if(self.Piece != None):
+            board.Piece = Piece(self.Piece.x, self.Piece.y, self.Piece.type)
+            board.Piece.rotation = self.Piece.rotation
+        return board
+
+    # check piece collision as if the piece was at (x, y) with the given rotation
+    def fits(self, x, y, rotation):
+        original = (self.Piece.x, self.Piece.y, self.Piece.rotation)
+        self.Piece.x, self.Piece.y, self.Piece.rotation = x, y, rotation
+        collision = self.check_collision()
+        self.Piece.x, self.Piece.y, self.Piece.rotation = original
+        return not collision
+
+    # row the piece lands on when dropped from above the stack at column x
+    # only valid while the piece is above the highest filled cell of every column it covers
+    def contour_landing(self, x, rotation):
+        landing = self.height
+        for column, bottom in BOTTOMS[self.Piece.type][rotation]:
+            landing = min(landing, self.height - self.column_heights[x + column] - 1 - bottom)
+        return landing
+
+    # when user presses space, hard drop to bottom of screen and lock
+    def hard_drop(self):
+        lowest_y = self.lowest_possible()
+        if(lowest_y != self.Piece.y):
+            self.rotated = False
+        self.Piece.y = lowest_y
+        self.lock()
+
+    # returns lowest point of piece to help draw ghost note
+    def lowest_possible(self):
+        # above the stack the landing row comes straight from the column heights
+        landing = self.contour_landing(self.Piece.x, self.Piece.rotation)
+        if(landing >= self.Piece.y):
+            return landing
+        # piece is tucked under the stack, move it down one row at a time
+        # keep track of original position since the piece doesn't actually move
+        original_y = self.Piece.y
+        while(not self.check_collision()):
+            self.Piece.y += 1
+        self.Piece.y -= 1
+        # return lowest position, return piece to original position
+        lowest_y = self.Piece.y
+        self.Piece.y = original_y
+        return lowest_y
+
+    # when user presses space or when natural gravity takes place, move one square down
+    def soft_drop(self):
+        self.Piece.y += 1
+        # if collides, then lock piece
+        if(self.check_collision()):
+            self.Piece.y -= 1
+            self.lock()
+        else:
+            self.rotated = False
+
+    # locks piece, adds to playfield, clears lines
+    def lock(self):
+        # corners have to be checked before the piece is part of the playfield
+        tspin = self.is_tspin()
+        # add piece shape to playfield
+        for j, i in OFFSETS[self.Piece.type][self.Piece.rotation]:
+            self.playfield[i + self.Piece.y][j + self.Piece.x] = self.Piece.type + 1
+        self.raise_heights()
+        self.finish_lock(tspin)
+
+    # clears the rows the locked piece filled and records what happened
+    def finish_lock(self, tspin):
+        self.locked_rows = tuple(sorted(set(self.Piece.y + i for _, i in OFFSETS[self.Piece.type][self.Piece.rotation])))
+        # only rows the piece covers can have become full
+        self.last_clear = self.clear_lines(self.locked_rows, tspin)
+        self.locks += 1
+        self.Piece = None
+
+    # whether the current piece is a T that rotated into place with at least 3 blocked corners,
+    # walls and floor count as blocked, the open space above the playfield doesn't
+    def is_tspin(self):
+        if(self.Piece.type != T_PIECE or not self.rotated):
+            return False
+        blocked = 0
+        for i, j in T_CORNERS:
+            row = self.Piece.y + i
+            column = self.Piece.x + j
+            if(row < 0):
+                continue
+            if(row >= self.height or column < 0 or column >= self.width
+               or self.playfield[row][column] > 0):
+                blocked += 1
+        return blocked >= 3
+
+    # updates the column heights, cell counts and hash with the cells of the piece that is being locked
+    def raise_heights(self):
+        for j, i in OFFSETS[self.Piece.type][self.Piece.rotation]:
+            row = self.Piece.y + i
+            column = self.Piece.x + j
+            self.column_cells[column] += 1
+            self.row_hashes[row] ^= self.cell_keys[row][column]
+            self.hash ^= self.cell_keys[row][column]
+            self.column_heights[column] = max(self.column_heights[column], self.height - row)
+
+    # updates the column heights and cell counts after full rows were removed
+    # cells only ever move down, so every column is scanned down from its old top
+    def lower_heights(self, lines):
+        for column in range(0, self.width):
+            # every full row had one cell in each column
+            self.column_cells[column] -= lines
+            top = self.height - self.column_heights[column]
+            while(top < self.height and self.playfield[top][column] == 0):
+                top += 1
+            self.column_heights[column] = self.height - top
+
+    # updates everything kept about the playfield after the given full rows were removed
+    def rows_removed(self, cleared):
+        self.lower_heights(len(cleared))
+        self.rehash(cleared[-1])
+        self.lines_cleared += len(cleared)
+
+    # updates the hash of every row down to lowest, the rows below it didn't move
+    def rehash(self, lowest):
+        # rows above the stack are empty
+        top = self.height - max(self.column_heights)
+        for row in range(0, lowest + 1):
+            row_hash = 0
+            if(row >= top):
+                keys = self.cell_keys[row]
+                cells = self.playfield[row]
+                for column in range(0, self.width):
+                    if(cells[column] > 0):
+                        row_hash ^= keys[column]
+            self.hash ^= self.row_hashes[row] ^ row_hash
+            self.row_hashes[row] = row_hash
+
+    # pushes the stack up by lines rows of garbage, every row full except for column hole
+    # cells pushed out of the top and a current piece that can't move up out of the way end the game
+    def add_garbage(self, lines, hole):
+        lines = min(lines, self.height)
+        if(max(self.column_heights) > self.height - lines):
+            self.active = False
+        self.insert_rows(lines, hole)
+        self.recount()
+        # the current piece moves up out of the garbage
+        if(self.Piece != None):
+            while(self.check_collision() and self.Piece.y >= -3):
+                self.Piece.y -= 1
+            if(self.check_collision()):
+                self.active = False
+        # every row moved, drawing code has to look at all of them
+        self.locks += 1
+        self.locked_rows = ()
+        self.last_clear = None
+
+    # removes the top lines rows and adds garbage rows with a hole at the bottom
+    def insert_rows(self, lines, hole):
+        garbage = [GARBAGE_CELL] * self.width
+        garbage[hole] = 0
+        self.playfield[:] = self.playfield[lines:] + [garbage[:] for _ in range(0, lines)]
+
+    # works out the column heights, cell counts and hash from the whole playfield again,
+    # for when every row moved
+    def recount(self):
+        self.column_heights = [0] * self.width
+        self.column_cells = [0] * self.width
+        self.hash = 0
+        for row in range(0, self.height):
+            row_hash = 0
+            for column, value in enumerate(self.playfield[row]):
+                if(value > 0):
+                    row_hash ^= self.cell_keys[row][column]
+                    self.column_cells[column] += 1
+                    if(self.column_heights[column] == 0):
+                        self.column_heights[column] = self.height - row
+            self.row_hashes[row] = row_hash
+            self.hash ^= row_hash
+
+    # turns (1 for clockwise, -1 for counterclockwise) that take the current piece to rotation
+    # in place, every rotation on the way has to fit without a kick, so the turns play out as
+    # checked here, fewer turns first, None if there is no such way
+    def rotation_path(self, rotation):
+        count = ROTATION_COUNTS[self.Piece.type]
+        start = self.Piece.rotation
+        paths = sorted([[1] * ((rotation - start) % count), [-1] * ((start - rotation) % count)], key=len)
+        for path in paths:
+            current = start
+            for direction in path:
+                current = (current + direction) % count
+                if(not self.fits(self.Piece.x, self.Piece.y, current)):
+                    break
+            else:
+                return path
+        return None
+
+    # every (x, rotation, landing y) the current piece can reach by turning in place
+    # (see rotation_path), moving sideways at its current height and dropping straight down
+    def placements(self):
+        results = []
+        y = self.Piece.y
+        for rotation in range(0, ROTATION_COUNTS[self.Piece.type]):
+            if(self.rotation_path(rotation) == None):
+                continue
+            # walk left from the current column, then right, until something is in the way
+            for direction in (-1, 1):
+                x = self.Piece.x if direction == -1 else self.Piece.x + 1
+                while(True):
+                    landing = self.landing(x, y, rotation)
+                    if(landing == None):
+                        break
+                    results.append((x, rotation, landing))
+                    x += direction
+        return results
+
+    # landing row of the current piece dropped from (x, y) with the given rotation,
+    # or None if it doesn't fit there
+    def landing(self, x, y, rotation):
+        columns = BOTTOMS[self.Piece.type][rotation]
+        if(x + columns[0][0] < 0 or x + columns[-1][0] > self.width - 1):
+            return None
+        landing = self.contour_landing(x, rotation)
+        if(landing >= y):
+            return landing
+        # under the stack, fall back to collision checks
+        if(not self.fits(x, y, rotation)):
+            return None
+        while(self.fits(x, y + 1, rotation)):
+            y += 1
+        return y
+
+    # when player presses left or right arrow, returns whether the piece moved
+    def horizontal_move(self, direction):
+        # attempt to move in direction
+        self.Piece.x += direction
+        # if collision, return to original spot
+        if(self.check_collision()):
+            self.Piece.x -= direction
+            return False
+        self.rotated = False
+        return True
+
+    # once all ten pieces are filled in a row, it disappears and the other rows move down
+    # only the given rows are checked, or all of them if rows is None
+    # returns a ClearEvent describing the clear
+    def clear_lines(self, rows=None, tspin=False):
+        if(rows == None):
+            rows = range(0, self.height)
+        cleared = [row for row in rows if 0 not in self.playfield[row]]
+        if(len(cleared) > 0):
+            self.remove_rows(cleared)
+            self.rows_removed(cleared)
+        return ClearEvent(cleared, tspin)
+
+    # removes full rows (sorted top to bottom) in one pass over the playfield,
+    # the rows above move down and empty rows are added at the top
+    def remove_rows(self, cleared):
+        removed = set(cleared)
+        kept = [self.playfield[row] for row in range(0, self.height) if row not in removed]
+        self.playfield[:] = [[0] * self.width for _ in cleared] + kept
+
+# one game session: the board plus the 7-bag, hold piece, gravity and win/loss rules
+class Game:
+    # initialize with a seed for the bag, board size, playfield backend and timings in milliseconds
+    def __init__(self, seed=None, height=20, width=10, board=Tetris,
+                 gravity_ms=GRAVITY_MS, lock_delay_ms=LOCK_DELAY_MS):
+        self.seed = seed
+        # every game has its own random generator so runs are reproducible
+        self.random = random.Random(seed)
+        self.board = board(height, width)
+        # upcoming pieces, always holds at least one full bag so the preview works
+        self.queue = []
+        self.fill_bag()
+        self.hold_piece = None
+        # can hold once per piece
+        self.hold_used = False
+        self.pieces_placed = 0
+        # number of fixed TICK_MS steps taken
+        self.ticks = 0
+        self.gravity_ms = gravity_ms
+        self.lock_delay_ms = lock_delay_ms
+        # time since the piece last fell, and how long it has been resting on the stack
+        self.gravity_timer = 0
+        self.lock_timer = 0
+        self.lock_resets = 0
+        self.won = False
+        # points, and how many clears of every kind (plus t-spins) were made
+        self.score = 0
+        self.clears = {name: 0 for name in list(CLEAR_NAMES.values()) + ["tspin"]}
+        # (tick, action) of every action applied, None unless recording, see replay.py
+        self.log = None
+        # versus games: lines of garbage received and not added yet, and lines to send
+        self.incoming = 0
+        self.outgoing = 0
+        # where the holes in garbage go, separate from the bag so it doesn't change the pieces
+        self.garbage_random = random.Random(None if seed == None else "garbage %s" % seed)
+        self.spawn()
+
+    # starts recording every action applied from now on
+    def record(self):
+        self.log = []
+
+    # game time in milliseconds
+    @property
+    def time(self):
+        return self.ticks * TICK_MS
+
+    # whether the game is still being played
+    @property
+    def active(self):
+        return self.board.active
+
+    # instead of generating random pieces, all seven pieces are given in a random order
+    def fill_bag(self):
+        while(len(self.queue) < 7):
+            bag = list(range(0, 7))
+            self.random.shuffle(bag)
+            self.queue.extend(bag)
+
+    # type of the piece that will be spawned next
+    def next_piece(self):
+        return self.queue[0]
+
+    # takes the next piece from the bag, unless a piece type is given
+    def spawn(self, piece_type=None):
+        if(piece_type == None):
+            piece_type = self.queue.pop(0)
+            self.fill_bag()
+        self.board.create_piece(piece_type)
+        # player is allowed to hold again
+        self.hold_used = False
+        self.gravity_timer = 0
+        self.lock_timer = 0
+        self.lock_resets = 0
+        # if there is a collision, player loses, if player clears 40 lines player wins
+        if(self.board.check_collision() or self.board.lines_cleared >= LINES_TO_WIN):
+            self.won = self.board.lines_cleared >= LINES_TO_WIN
+            self.board.active = False
+            return False
+        return True
+
+    # garbage sent by another player, it comes in when a piece locks without clearing lines
+    def receive_garbage(self, lines):
+        if(not self.board.active):
+            return
+        if(self.log != None):
+            self.log.append((self.ticks, GARBAGE, lines))
+        self.incoming += lines
+
+    # swaps the current piece with the hold piece, once per piece
+    def hold(self):
+        if(self.hold_used):
+            return False
+        held = self.hold_piece
+        self.hold_piece = self.board.Piece.type
+        # if there was no piece held, the next piece from the bag comes in
+        self.spawn(held)
+        self.hold_used = True
+        return True
+
+    # applies one action without advancing time
+    # returns the list of events that happened, for sounds and stats
+    def apply(self, action):
+        events = []
+        if(not self.board.active):
+            return events
+        if(action != None and self.log != None):
+            self.log.append((self.ticks, action))
+        if(action == RESIGN):
+            self.board.active = False
+            events.append("gameover")
+        elif(action == LEFT or action == RIGHT):
+            if(self.board.horizontal_move(-1 if action == LEFT else 1)):
+                events.append("move")
+                self.reset_lock()
+        elif(action == ROTATE_CW):
+            if(self.board.rotate(1)):
+                self.reset_lock()
+        elif(action == ROTATE_CCW):
+            if(self.board.rotate(-1)):
+                self.reset_lock()
+        elif(action == HOLD):
+            if(self.hold()):
+                events.append("hold")
+                # the swapped in piece can spawn into the stack
+                if(not self.board.active):
+                    events.append("gameover")
+        elif(action == SOFT_DROP):
+            self.board.soft_drop()
+        elif(action == HARD_DROP):
+            self.board.hard_drop()
+        self.after_move(events)
+        return events
+
+    # restarts the lock delay after the piece moved, a limited number of times per piece
+    def reset_lock(self):
+        if(self.lock_timer > 0 and self.lock_resets < MAX_LOCK_RESETS):
+            self.lock_timer = 0
+            self.lock_resets += 1
+
+    # applies one action (or None) and advances the game by TICK_MS milliseconds
+    def step(self, action=None):
+        events = self.apply(action)
+        if(not self.board.active):
+            return events
+        self.ticks += 1
+        # gravity moves the piece down but never locks it, that is left to the lock delay
+        self.gravity_timer += TICK_MS
+        landing = self.board.lowest_possible()
+        while(self.gravity_timer >= self.gravity_ms):
+            self.gravity_timer -= self.gravity_ms
+            if(self.board.Piece.y < landing):
+                self.board.Piece.y += 1
+                self.board.rotated = False
+        # lock delay
+        if(self.board.Piece.y == landing):
+            self.lock_timer += TICK_MS
+            if(self.lock_timer >= self.lock_delay_ms):
+                self.board.lock()
+                self.after_move(events)
+        else:
+            self.lock_timer = 0
+        return events
+
+    # if the piece was placed, count it and spawn the next one
+    def after_move(self, events):
+        if(self.board.Piece != None):
+            return
+        self.pieces_placed += 1
+        events.append("drop")
+        self.score_clear(self.board.last_clear)
+        if(self.board.last_clear.lines > 0):
+            events.append("clear")
+        self.exchange_garbage(self.board.last_clear, events)
+        self.spawn()
+        if(not self.board.active):
+            events.append("gameover")
+
+    # adds the clear made by the piece that just locked to the score and stats
+    def score_clear(self, clear):
+        if(clear.tspin):
+            self.clears["tspin"] += 1
+            self.score += TSPIN_POINTS[clear.kind]
+        else:
+            self.score += CLEAR_POINTS[clear.kind]
+        if(clear.kind != None):
+            self.clears[clear.kind] += 1
+
+    # a clear sends garbage, cancelling incoming garbage first, and a piece that clears nothing
+    # lets the incoming garbage in
+    def exchange_garbage(self, clear, events):
+        if(clear.lines > 0):
+            sent = 2 * clear.lines if clear.tspin else GARBAGE_LINES[clear.kind]
+            cancelled = min(sent, self.incoming)
+            self.incoming -= cancelled
+            self.outgoing += sent - cancelled
+        elif(self.incoming > 0):
+            self.board.add_garbage(self.incoming, self.garbage_random.randrange(0, self.board.width))
+            self.incoming = 0
+            events.append("garbage")
@@ -0,0 +1,79 @@
+# font registry and text render cache
+# pygame.font.SysFont does a system font lookup every time it is called, so every font is
+# looked up once here and rendered text is cached by (text, font, colour)
+
+import pygame
+from collections import OrderedDict
+
+# every font used by the game, by name: (system font, size, bold, italic)
+FONTS = {
+    "main": ("myanmartext", 25, True, False),
+    "message": ("myanmartext", 30, False, False),
+    "title": ("Source Code Pro", 60, False, False),
+    "profiler": ("Source Code Pro", 14, False, False),
+    "small": ("Source Code Pro", 12, False, False)
+}
+# most rendered strings kept in the cache, least recently used ones are dropped first
+CACHE_SIZE = 256
+
+# loaded pygame fonts, by name
+loaded_fonts = {}
+# rendered surfaces, by (text, font name, colour)
+rendered = OrderedDict()
+
+# returns the font registered under name, loading it the first time it is used
+def get_font(name):
+    if(name not in loaded_fonts):
+        system_name, size, bold, italic = FONTS[name]
+        loaded_fonts[name] = pygame.font.SysFont(system_name, size, bold, italic)
+    return loaded_fonts[name]
+
+# loads every registered font up front
+def load_fonts():
+    for name in FONTS:
+        get_font(name)
+
+# returns text rendered with the named font, rendering it only the first time
+def render(text, font_name, colour):
+    key = (text, font_name, colour)
+    if(key in rendered):
+        rendered.move_to_end(key)
+        return rendered[key]
+    surface = get_font(font_name).render(text, True, colour)
+    rendered[key] = surface
+    if(len(rendered) > CACHE_SIZE):
+        rendered.popitem(last=False)
+    return surface
+
+# pre-rendered glyphs for drawing numbers that change every frame, like the timer,
+# without rendering a new surface each time
+class DigitAtlas:
+    # characters that can be drawn with the atlas
+    characters = "0123456789.-:"
+
+    # renders every character once with the named font
+    def __init__(self, font_name, colour):
+        self.glyphs = {}
+        for character in self.characters:
+            self.glyphs[character] = render(character, font_name, colour)
+        self.height = max(glyph.get_height() for glyph in self.glyphs.values())
+
+    # width of text drawn with the atlas
+    def width(self, text):
+        return sum(self.glyphs[character].get_width() for character in text)
+
+    # draws text onto surface with its top left at position, returns the covered rect
+    def draw(self, surface, text, position):
+        x, y = position
+        surface.blits([(self.glyphs[character], (x + offset, y))
+                       for character, offset in zip(text, self.offsets(text))], False)
+        return pygame.Rect(x, y, self.width(text), self.height)
+
+    # x offset of every character of text
+    def offsets(self, text):
+        offsets = []
+        x = 0
+        for character in text:
+            offsets.append(x)
+            x += self.glyphs[character].get_width()
+        return offsets
@@ -0,0 +1,238 @@
+# load test for the versus relay
+# simulates many headless versus players, spread over worker processes, that each play a random
+# game in real time against the others in their room through a relay, just like tetris.py
+# --connect does, and reports how many messages got through and how long they took to arrive
+# a relay is started in its own process unless --connect names one that is already running
+#
+# usage: python loadtest.py --clients 200 --room-size 4 --seconds 10 [--workers 4]
+#        python loadtest.py --connect 127.0.0.1:7777 --clients 500
+
+import argparse, asyncio, json, multiprocessing, os, random, time
+
+import net, replay
+from engine import Game, Tetris, TICK_MS
+from runner import random_policy
+
+# every simulated player applies one of its planned actions every ACTION_MS
+ACTION_MS = 50
+# most game time a player catches up at once when its worker falls behind
+MAX_FRAME_MS = 250
+# how long players keep trying to connect while the relay starts
+CONNECT_TIMEOUT = 10
+
+# runs a relay until the process is terminated
+def run_relay(host, port):
+    try:
+        asyncio.run(net.Relay().run(host, port))
+    except KeyboardInterrupt:
+        pass
+
+# messages, bytes and latencies counted by the players of one worker
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # seconds between an update being queued and it arriving at another player
+        self.latencies = []
+        self.games = 0
+        self.errors = 0
+
+# one headless player: plays random games, sends them like net.Versus does and takes garbage
+class SimulatedPlayer:
+    def __init__(self, index, args, stats):
+        self.rng = random.Random(args.seed + index)
+        self.room = "load-%d" % (index // args.room_size)
+        self.height = args.height
+        self.width = args.width
+        self.stats = stats
+        # encoded lines waiting for the next batch
+        self.pending = []
+        self.start()
+
+    # starts a new game and says hello with it
+    def start(self):
+        self.game = Game(self.rng.randrange(1 << 30), self.height, self.width, Tetris)
+        self.game.record()
+        self.stats.games += 1
+        self.sent = 0
+        self.sent_tick = 0
+        self.plan = []
+        self.planned_piece = -1
+        self.action_timer = 0
+        self.accumulator = 0
+        hello = replay.make_header(self.game)
+        hello["room"] = self.room
+        self.send({"hello": hello})
+
+    # queues a message for the next batch
+    def send(self, message):
+        line = net.encode_message(message)
+        self.pending.append(line)
+        self.stats.sent += 1
+        self.stats.bytes_sent += len(line)
+
+    # plays ms of game time, one planned action every ACTION_MS
+    def advance(self, ms):
+        self.accumulator = min(self.accumulator + ms, MAX_FRAME_MS)
+        while(self.accumulator >= TICK_MS and self.game.active):
+            self.accumulator -= TICK_MS
+            self.action_timer += TICK_MS
+            if(self.action_timer >= ACTION_MS):
+                self.action_timer -= ACTION_MS
+                if(self.planned_piece != self.game.pieces_placed):
+                    self.plan = random_policy(self.game, self.rng)
+                    self.planned_piece = self.game.pieces_placed
+                if(len(self.plan) > 0):
+                    self.game.apply(self.plan.pop(0))
+            self.game.step()
+
+    # queues what the game did since the last update, stamped with when it was sent
+    def update(self):
+        game = self.game
+        log = game.log[self.sent:]
+        message = {"tick": game.ticks, "log": replay.encode(log, self.sent_tick), "sent": time.time()}
+        if(len(log) > 0):
+            self.sent = len(game.log)
+            self.sent_tick = log[-1][0]
+        if(game.outgoing > 0):
+            message["attack"] = game.outgoing
+            game.outgoing = 0
+        self.send(message)
+
+    # handles one line from the relay
+    def receive(self, line):
+        self.stats.received += 1
+        self.stats.bytes_received += len(line)
+        message = json.loads(line)
+        if("sent" in message):
+            self.stats.latencies.append(time.time() - message["sent"])
+        if(message.get("attack", 0) > 0 and self.game.active):
+            self.game.receive_garbage(message["attack"])
+
+    # plays, sends and receives until stop, a time.time() timestamp
+    async def run(self, host, port, stop):
+        reader, writer = await connect(host, port)
+        reading = asyncio.create_task(self.read_loop(reader))
+        last = time.perf_counter()
+        try:
+            while(time.time() < stop and not reading.done()):
+                await asyncio.sleep(net.SEND_MS / 1000)
+                now = time.perf_counter()
+                self.advance((now - last) * 1000)
+                last = now
+                self.update()
+                # a finished game is sent in full before the next one starts
+                if(not self.game.active):
+                    self.start()
+                writer.write(b"".join(self.pending))
+                self.pending = []
+                await writer.drain()
+        except ConnectionError:
+            self.stats.errors += 1
+        reading.cancel()
+        writer.close()
+
+    async def read_loop(self, reader):
+        try:
+            while(True):
+                line = await reader.readline()
+                if(not line):
+                    # the relay dropped this player
+                    self.stats.errors += 1
+                    return
+                self.receive(line)
+        except (ConnectionError, ValueError):
+            self.stats.errors += 1
+
+# opens a connection, retrying while the relay is still starting
+async def connect(host, port):
+    give_up = time.perf_counter() + CONNECT_TIMEOUT
+    while(True):
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError:
+            if(time.perf_counter() > give_up):
+                raise
+            await asyncio.sleep(0.1)
+
+# runs some of the players on one event loop until stop, returns their counts
+async def run_players(indices, args, stop):
+    stats = Stats()
+    players = [SimulatedPlayer(index, args, stats) for index in indices]
+    await asyncio.gather(*[player.run(args.host, args.port, stop) for player in players])
+    return stats
+
+# runs in a worker process
+def run_worker(task):
+    indices, args, stop = task
+    return vars(asyncio.run(run_players(indices, args, stop)))
+
+# value below which fraction of the sorted values fall
+def percentile(values, fraction):
+    if(len(values) == 0):
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# adds up the counts of every worker
+def summarize(results, args, elapsed):
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    summary = {
+        "clients": args.clients,
+        "rooms": -(-args.clients // args.room_size),
+        "seconds": elapsed,
+        "games": sum(result["games"] for result in results),
+        "errors": sum(result["errors"] for result in results)
+    }
+    for key in ["sent", "received", "bytes_sent", "bytes_received"]:
+        total = sum(result[key] for result in results)
+        summary[key] = total
+        summary[key + "_per_second"] = total / elapsed
+    summary["latency_ms"] = {}
+    for name, fraction in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1)]:
+        value = percentile(latencies, fraction)
+        summary["latency_ms"][name] = None if value == None else value * 1000
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the versus relay with headless players.")
+    parser.add_argument("--clients", type=int, default=100, help="number of simulated players")
+    parser.add_argument("--room-size", type=int, default=2, help="players per room")
+    parser.add_argument("--seconds", type=float, default=10, help="how long the players play")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count()),
+                        help="processes the players are spread over")
+    parser.add_argument("--connect", metavar="HOST:PORT", default=None,
+                        help="use a relay that is already running instead of starting one")
+    parser.add_argument("--port", type=int, default=net.PORT, help="port of the relay started here")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--height", type=int, default=20)
+    parser.add_argument("--width", type=int, default=10)
+    args = parser.parse_args()
+
+    relay = None
+    if(args.connect != None):
+        host, _, port = args.connect.rpartition(":")
+        args.host = host or net.HOST
+        args.port = int(port)
+    else:
+        args.host = net.HOST
+        relay = multiprocessing.Process(target=run_relay, args=(args.host, args.port), daemon=True)
+        relay.start()
+    workers = max(1, min(args.workers, args.clients))
+    indices = list(range(0, args.clients))
+    # every player stops at the same time, whichever worker it is on
+    start = time.time()
+    stop = start + args.seconds
+    tasks = [(indices[worker::workers], args, stop) for worker in range(0, workers)]
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(run_worker, tasks)
+    finally:
+        if(relay != None):
+            relay.terminate()
+            relay.join()
+    print(json.dumps(summarize(results, args, time.time() - start), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# networked versus mode
+# a small asyncio relay passes messages between the players of a room. Every client plays its own
+# game locally and sends what it did as replay tokens (see replay.encode), which the other clients
+# re-simulate to show its board, along with the garbage its clears send
+# the client's socket runs on an asyncio loop in a background thread, the game loop only puts
+# messages in a queue and takes received ones out, so it never waits on the network
+# messages are json lines, everything queued is written together every SEND_MS
+#
+# usage: python net.py [--host 127.0.0.1] [--port 7777]     starts a relay
+#        python tetris.py --connect 127.0.0.1:7777           plays against everyone on it
+
+import argparse, asyncio, json, queue, threading
+
+import replay
+from engine import Tetris
+
+HOST = "127.0.0.1"
+PORT = 7777
+# players join this room unless they name another one
+ROOM = "default"
+# queued messages are sent this often, in one write
+SEND_MS = 16
+# most bytes waiting to be sent to one connection before the relay drops it as too slow
+MAX_BACKLOG = 1 << 20
+# smallest and largest number of rows and columns a game may have, the others re-simulate it
+MIN_SIZE = 4
+MAX_SIZE = 100
+# most ticks of one opponent's game re-simulated per update, a game far ahead (one joined late
+# or a broken tick) is caught up on over several frames instead of holding up the game loop
+MAX_CATCH_UP_TICKS = 200
+
+# one json message as a line of bytes
+def encode_message(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+# whether a json value is a whole number, json true and false are not
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# whether a hello's header has the settings replay.new_game needs, with values a game can run on
+def valid_header(hello):
+    for key in ("seed", "height", "width", "gravity_ms", "lock_delay_ms"):
+        if(not is_int(hello.get(key))):
+            return False
+    return (MIN_SIZE <= hello["height"] <= MAX_SIZE and MIN_SIZE <= hello["width"] <= MAX_SIZE
+            and hello["gravity_ms"] > 0 and hello["lock_delay_ms"] >= 0)
+
+# whether a message from a player has the shape the relay and Versus.receive expect: an object,
+# either a hello with a game header that names its room with a string if at all, or an update
+# with its tick, its log and the lines of garbage it sends
+# the log's tokens are only checked by the players decoding them
+def valid_message(message):
+    if(not isinstance(message, dict)):
+        return False
+    if("hello" in message):
+        hello = message["hello"]
+        return isinstance(hello, dict) and isinstance(hello.get("room", ROOM), str) and valid_header(hello)
+    attack = message.get("attack", 0)
+    return (is_int(message.get("tick")) and message["tick"] >= 0 and isinstance(message.get("log"), str)
+            and is_int(attack) and attack >= 0)
+
+# one connection to the relay
+class Peer:
+    def __init__(self, peer_id, writer):
+        self.id = peer_id
+        self.writer = writer
+        self.room = None
+        # the hello of the game being played and every update since, for players joining later
+        self.hello = None
+        self.history = []
+        # lines waiting to be written, the writer task sends them all at once
+        self.pending = []
+        self.backlog = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    # queues a line, closing the connection if it can't keep up
+    def send(self, line):
+        if(self.closed):
+            return
+        self.pending.append(line)
+        self.backlog += len(line)
+        if(self.backlog + self.writer.transport.get_write_buffer_size() > MAX_BACKLOG):
+            self.closed = True
+            self.writer.close()
+        self.ready.set()
+
+# relay server: every message a player sends is passed on to the other players in its room
+class Relay:
+    def __init__(self):
+        self.rooms = {}
+        self.next_id = 1
+        # messages and bytes received, for reporting
+        self.messages = 0
+        self.bytes = 0
+
+    # listens on host and port until cancelled
+    async def run(self, host=HOST, port=PORT, started=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if(started != None):
+            started()
+        async with server:
+            await server.serve_forever()
+
+    # reads one connection until it closes
+    async def handle(self, reader, writer):
+        peer = Peer(self.next_id, writer)
+        self.next_id += 1
+        sender = asyncio.create_task(self.write_loop(peer))
+        try:
+            while(not peer.closed):
+                line = await reader.readline()
+                if(not line):
+                    break
+                self.messages += 1
+                self.bytes += len(line)
+                message = json.loads(line)
+                # anything else is a broken or hostile client, which is dropped
+                if(not valid_message(message)):
+                    break
+                self.receive(peer, message)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.leave(peer)
+            sender.cancel()
+            writer.close()
+
+    # writes everything queued for a peer in one go whenever there is something
+    async def write_loop(self, peer):
+        try:
+            while(not peer.closed):
+                await peer.ready.wait()
+                peer.ready.clear()
+                data = b"".join(peer.pending)
+                peer.pending = []
+                peer.backlog = 0
+                peer.writer.write(data)
+                await peer.writer.drain()
+        except ConnectionError:
+            peer.closed = True
+
+    # handles one message from a peer
+    def receive(self, peer, message):
+        if("hello" in message):
+            # a new game, possibly in another room
+            if(peer.room != message["hello"].get("room", ROOM)):
+                self.leave(peer)
+                peer.room = message["hello"].get("room", ROOM)
+                room = self.rooms.setdefault(peer.room, {})
+                # the newcomer catches up on the games already being played
+                for other in room.values():
+                    if(other.hello != None):
+                        peer.send(encode_message({"from": other.id, "hello": other.hello}))
+                        for update in other.history:
+                            peer.send(update)
+                room[peer.id] = peer
+                peer.send(encode_message({"welcome": peer.id}))
+            peer.hello = message["hello"]
+            peer.history = []
+        if(peer.room == None):
+            return
+        message["from"] = peer.id
+        line = encode_message(message)
+        # updates with nothing but the tick don't need to be caught up on
+        if("hello" not in message and (message.get("log") or message.get("attack"))):
+            peer.history.append(line)
+        for other in self.rooms[peer.room].values():
+            if(other is not peer):
+                other.send(line)
+
+    # removes a peer from its room and tells the others
+    def leave(self, peer):
+        if(peer.room == None):
+            return
+        room = self.rooms[peer.room]
+        room.pop(peer.id, None)
+        line = encode_message({"from": peer.id, "bye": True})
+        for other in room.values():
+            other.send(line)
+        if(len(room) == 0):
+            del self.rooms[peer.room]
+        peer.room = None
+
+# connection to a relay, run on an asyncio loop in a background thread
+# send and poll never block, errors arrive as {"error": ...} messages
+class NetClient:
+    def __init__(self, host=HOST, port=PORT):
+        self.host = host
+        self.port = port
+        self.outgoing = queue.SimpleQueue()
+        self.incoming = queue.SimpleQueue()
+        self.closed = False
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self.thread.start()
+
+    # queues a message to be sent with the next batch
+    def send(self, message):
+        self.outgoing.put(message)
+
+    # every message received since the last call
+    def poll(self):
+        messages = []
+        while(True):
+            try:
+                messages.append(self.incoming.get_nowait())
+            except queue.Empty:
+                return messages
+
+    # stops the background thread, whatever is still queued is sent first
+    def close(self):
+        self.closed = True
+        self.thread.join(1)
+
+    async def run(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as error:
+            self.incoming.put({"error": str(error)})
+            return
+        reading = asyncio.create_task(self.read_loop(reader))
+        try:
+            while(not reading.done()):
+                closing = self.closed
+                batch = []
+                while(not self.outgoing.empty()):
+                    batch.append(encode_message(self.outgoing.get()))
+                if(len(batch) > 0):
+                    writer.write(b"".join(batch))
+                    await writer.drain()
+                if(closing):
+                    break
+                await asyncio.sleep(SEND_MS / 1000)
+        except ConnectionError as error:
+            self.incoming.put({"error": str(error)})
+        reading.cancel()
+        writer.close()
+
+    async def read_loop(self, reader):
+        try:
+            while(True):
+                line = await reader.readline()
+                if(not line):
+                    self.incoming.put({"error": "connection closed by the relay"})
+                    return
+                self.incoming.put(json.loads(line))
+        except (ConnectionError, ValueError) as error:
+            self.incoming.put({"error": str(error)})
+
+# a game played against everyone in a room: sends what the game does and the garbage it sends,
+# re-simulates the other players' games from what they send and gives the game their garbage
+class Versus:
+    def __init__(self, client, room=ROOM, board=Tetris):
+        self.client = client
+        self.room = room
+        self.board = board
+        self.session = None
+        # replay players re-simulating every other player's game, by player id
+        self.opponents = {}
+        # tick of the last log entry received from every other player
+        self.opponent_ticks = {}
+        # entries of the log already sent and the tick of the last one
+        self.sent = 0
+        self.sent_tick = 0
+        self.error = None
+
+    # starts sending a new game, which is recorded so its actions can be sent
+    def start(self, session):
+        if(session.log == None):
+            session.record()
+        self.session = session
+        self.sent = 0
+        self.sent_tick = 0
+        hello = replay.make_header(session)
+        hello["room"] = self.room
+        self.client.send({"hello": hello})
+
+    # sends what the game did since the last call and applies everything received
+    # called once per frame, never waits on the network
+    def update(self):
+        session = self.session
+        log = session.log[self.sent:]
+        message = {"tick": session.ticks, "log": replay.encode(log, self.sent_tick)}
+        if(len(log) > 0):
+            self.sent = len(session.log)
+            self.sent_tick = log[-1][0]
+        if(session.outgoing > 0):
+            message["attack"] = session.outgoing
+            session.outgoing = 0
+        self.client.send(message)
+        for message in self.client.poll():
+            self.receive(message)
+        self.catch_up()
+
+    # handles one message from the relay
+    def receive(self, message):
+        if(not isinstance(message, dict)):
+            return
+        if("error" in message):
+            self.error = message["error"]
+            return
+        sender = message.get("from")
+        if("bye" in message):
+            self.drop(sender)
+        elif("welcome" in message):
+            return
+        elif(not valid_message(message)):
+            # a broken or hostile player, its game isn't shown any more
+            self.drop(sender)
+        elif("hello" in message):
+            header = dict(message["hello"], ticks=0)
+            self.opponents[sender] = replay.Player(header, [], self.board)
+            self.opponent_ticks[sender] = 0
+        elif(sender in self.opponents):
+            player = self.opponents[sender]
+            try:
+                entries = replay.decode(message["log"], self.opponent_ticks[sender])
+            except (ValueError, KeyError):
+                self.drop(sender)
+                return
+            if(len(entries) > 0):
+                # actions before the tick the game was re-simulated to can't be played any more,
+                # and an update can't have actions after its own tick
+                if(entries[0][0] < player.game.ticks or entries[-1][0] > message["tick"]):
+                    self.drop(sender)
+                    return
+                player.log += entries
+                self.opponent_ticks[sender] = entries[-1][0]
+            # the other game is re-simulated up to where it is now, see catch_up
+            player.header["ticks"] = message["tick"]
+            if(message.get("attack", 0) > 0 and self.session.active):
+                self.session.receive_garbage(message["attack"])
+
+    # stops showing a player's game
+    def drop(self, sender):
+        self.opponents.pop(sender, None)
+        self.opponent_ticks.pop(sender, None)
+
+    # re-simulates every other player's game towards where it is now, at most
+    # MAX_CATCH_UP_TICKS ticks of each per call
+    def catch_up(self):
+        for player in self.opponents.values():
+            ticks = 0
+            while(not player.finished and ticks < MAX_CATCH_UP_TICKS):
+                player.step()
+                ticks += 1
+
+    # the other players' games, in the order they joined
+    def games(self):
+        return [self.opponents[key].game for key in sorted(self.opponents)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay server for versus tetris.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    relay = Relay()
+    try:
+        asyncio.run(relay.run(args.host, args.port,
+                              lambda: print("relay listening on %s:%d" % (args.host, args.port))))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-import random
+# piece shapes and every table derived from them
+# the tables are built once at import and are made of tuples, so the engine, the renderer
+# and the bot can look a shape up instead of scanning the 4x4 grid
 
 class Piece:
     pieces = [
@@ -24,6 +26,9 @@ class Piece:
         [[1, 2, 5, 6]]
     ]
 
+    # pieces are created for every spawn and for every board the bot searches
+    __slots__ = ("x", "y", "rotation", "type")
+
     # initialize with position, type of piece, and rotation
     def __init__(self, x, y, piece_type):
         self.x = x
@@ -34,10 +39,111 @@ class Piece:
     # rotate, either clockwise or counterclockwise
     def rotate(self, direction):
         if(direction == 1):
-            self.rotation = (self.rotation + 1) % len(self.pieces[self.type])
+            self.rotation = (self.rotation + 1) % ROTATION_COUNTS[self.type]
         else:
-            self.rotation = (self.rotation + 3) % len(self.pieces[self.type])
+            self.rotation = (self.rotation + ROTATION_COUNTS[self.type] - 1) % ROTATION_COUNTS[self.type]
 
-    # returns the position of each square of the piece, useful for drawing    
+    # returns the position of each square of the piece, useful for drawing
     def return_positions(self):
         return self.pieces[self.type][self.rotation]
+
+    # (column, row) offset of each square of the piece from its position
+    def offsets(self):
+        return OFFSETS[self.type][self.rotation]
+
+# number of distinct rotations of every piece type
+ROTATION_COUNTS = tuple(len(rotations) for rotations in Piece.pieces)
+
+# (dx, dy) of every cell of every piece type and rotation, top to bottom and left to right
+OFFSETS = tuple(tuple(tuple((p % 4, p // 4) for p in sorted(shape)) for shape in rotations)
+                for rotations in Piece.pieces)
+
+# for every piece type and rotation, the lowest (pick=max) or highest (pick=min) filled row of
+# every column the piece covers, as (dx, dy) pairs sorted by column
+def build_contours(pick):
+    contours = []
+    for rotations in OFFSETS:
+        piece_contours = []
+        for cells in rotations:
+            rows = {}
+            for dx, dy in cells:
+                rows[dx] = pick(rows[dx], dy) if dx in rows else dy
+            piece_contours.append(tuple(sorted(rows.items())))
+        contours.append(tuple(piece_contours))
+    return tuple(contours)
+
+# used to find landing rows from column heights
+BOTTOMS = build_contours(max)
+TOPS = build_contours(min)
+
+# SRS wall kicks, the guideline tables for every (from state, to state) in SRS numbering
+# (0 spawn, 1 turned clockwise, 2 upside down, 3 turned counterclockwise), x right and y up
+SRS_KICKS = {
+    (0, 1): ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    (1, 0): ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    (1, 2): ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    (2, 1): ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    (2, 3): ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    (3, 2): ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    (3, 0): ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    (0, 3): ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2))
+}
+SRS_I_KICKS = {
+    (0, 1): ((0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)),
+    (1, 0): ((0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)),
+    (1, 2): ((0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)),
+    (2, 1): ((0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)),
+    (2, 3): ((0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)),
+    (3, 2): ((0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)),
+    (3, 0): ((0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)),
+    (0, 3): ((0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1))
+}
+# SRS state of each of our rotations, rotating with direction 1 turns a piece counterclockwise
+SRS_STATES = (0, 3, 2, 1)
+
+# cells of an SRS state: the spawn shape turned clockwise state times inside its box
+def srs_cells(spawn, size, state):
+    cells = spawn
+    for _ in range(0, state):
+        cells = tuple((size - 1 - dy, dx) for dx, dy in cells)
+    return cells
+
+# how far our cells are moved from the SRS cells of the same shape, fails if they aren't the same shape
+def translation(ours, srs):
+    dx = min(x for x, _ in ours) - min(x for x, _ in srs)
+    dy = min(y for _, y in ours) - min(y for _, y in srs)
+    if(sorted(ours) != sorted((x + dx, y + dy) for x, y in srs)):
+        raise ValueError("piece shape doesn't match its SRS state")
+    return (dx, dy)
+
+# wall kicks of every piece type, KICKS[type][(from rotation, to rotation)] is a tuple of (dx, dy)
+# moves to try in order, y down. The plain rotation is always tried first, then the SRS tests
+# translated to where our shapes sit in the 4x4 grid compared to the SRS boxes
+def build_kicks():
+    kicks = []
+    for piece_type, rotations in enumerate(OFFSETS):
+        count = len(rotations)
+        if(count < 4):
+            # the O piece doesn't rotate
+            kicks.append({(0, 0): ((0, 0),)})
+            continue
+        size = 4 if piece_type == 0 else 3
+        table = SRS_I_KICKS if piece_type == 0 else SRS_KICKS
+        # the SRS spawn shapes are our first rotations moved to the left side of the box
+        left = min(dx for dx, _ in rotations[0])
+        spawn = tuple((dx - left, dy) for dx, dy in rotations[0])
+        moved = [translation(rotations[r], srs_cells(spawn, size, SRS_STATES[r]))
+                 for r in range(0, count)]
+        piece_kicks = {}
+        for start in range(0, count):
+            for end in ((start + 1) % count, (start - 1) % count):
+                tests = [(0, 0)]
+                for kx, ky in table[(SRS_STATES[start], SRS_STATES[end])]:
+                    test = (moved[start][0] - moved[end][0] + kx, moved[start][1] - moved[end][1] - ky)
+                    if(test not in tests):
+                        tests.append(test)
+                piece_kicks[(start, end)] = tuple(tests)
+        kicks.append(piece_kicks)
+    return tuple(kicks)
+
+KICKS = build_kicks()
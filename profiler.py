@@ -0,0 +1,209 @@
+# frame profiler
+# splits every frame into phases (event handling, simulation, drawing, waiting for the next frame),
+# times every draw call of the renderer and counts collision checks, shows the numbers in an
+# overlay toggled with F3 and can write them as a chrome trace (chrome://tracing, perfetto)
+# the per-call hooks are wrappers set on the board class and the renderer only while profiling,
+# so when the profiler is off the game runs the exact same code as without it
+
+import json, pygame, time
+
+import fonts
+
+# renderer methods timed while profiling, these are the phases of render and full_redraw
+DRAW_CALLS = ["draw_playfield", "draw_current_piece", "draw_next_piece", "draw_hold_piece",
+              "draw_text", "full_redraw"]
+# how often the overlay text is updated, numbers are averaged over that time
+OVERLAY_MS = 250
+# the overlay goes below the hold preview, at the renderer layout's overlay_position
+OVERLAY_WIDTH = 210
+# most events kept in a trace, so a long session can't use up memory
+MAX_TRACE_EVENTS = 500000
+
+class Profiler:
+    # initialize with the file to write a trace to, or None to only use the overlay
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.trace = []
+        self.visible = False
+        self.session = None
+        self.renderer = None
+        self.board = None
+        # board class whose collision check is counted, and its own definition of the check
+        # in that class, if it had one
+        self.collision_class = None
+        self.collision_original = None
+        # time of the frame's previous mark, and milliseconds spent in every phase this frame
+        self.frame_start = 0
+        self.last_mark = 0
+        self.phases = {}
+        self.collisions = 0
+        # time the first input of this frame was handled, until it is on screen
+        self.input_time = None
+        self.latency_ms = None
+        # sums over the frames since the overlay was last updated
+        self.totals = {}
+        self.frames = 0
+        self.overlay_time = 0
+        self.overlay_lines = []
+        self.overlay_rect = None
+
+    # whether hooks are installed and frames are measured
+    @property
+    def enabled(self):
+        return self.visible or self.trace_path != None
+
+    # starts profiling a new game
+    def attach(self, session, renderer):
+        self.uninstall()
+        self.session = session
+        self.renderer = renderer
+        self.board = session.board
+        if(self.enabled):
+            self.install()
+
+    # shows or hides the overlay
+    def toggle(self):
+        self.uninstall()
+        self.visible = not self.visible
+        if(self.enabled):
+            self.install()
+        if(not self.visible and self.overlay_rect != None):
+            # put back what was under the overlay
+            screen = pygame.display.get_surface()
+            screen.blit(self.renderer.background, self.overlay_rect, self.overlay_rect)
+            pygame.display.update(self.overlay_rect)
+            self.overlay_rect = None
+
+    # wraps the collision check and draw calls with counting and timing
+    def install(self):
+        # the collision check is wrapped on the board's class, so copies of the board the bot
+        # searches with are counted too
+        cls = type(self.board)
+        self.collision_class = cls
+        self.collision_original = cls.__dict__.get("check_collision")
+        setattr(cls, "check_collision", self.wrap(cls.check_collision, "collision", True))
+        for name in DRAW_CALLS:
+            setattr(self.renderer, name, self.wrap(getattr(self.renderer, name), name, False))
+
+    # removes the wrappers, the original methods are used again
+    def uninstall(self):
+        if(self.collision_class != None):
+            if(self.collision_original == None):
+                delattr(self.collision_class, "check_collision")
+            else:
+                setattr(self.collision_class, "check_collision", self.collision_original)
+            self.collision_class = None
+        if(self.renderer != None):
+            for name in DRAW_CALLS:
+                if(name in self.renderer.__dict__):
+                    delattr(self.renderer, name)
+
+    # a function that calls method and adds its time to the named phase
+    def wrap(self, method, name, count):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            end = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0) + (end - start) * 1000
+            if(count):
+                self.collisions += 1
+            # collision checks are too many and too short to be worth a trace event each
+            elif(self.trace_path != None):
+                self.add_trace_event(name, start, end)
+            return result
+        return wrapper
+
+    # adds a complete event to the trace, times are from time.perf_counter
+    def add_trace_event(self, name, start, end):
+        if(len(self.trace) < MAX_TRACE_EVENTS):
+            self.trace.append({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                               "ts": start * 1e6, "dur": (end - start) * 1e6})
+
+    # starts measuring a frame
+    def begin_frame(self):
+        if(not self.enabled):
+            return
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.phases = {}
+        self.collisions = 0
+
+    # an input was handled, the time until the next frame is on screen is its latency
+    def input(self):
+        if(self.enabled and self.input_time == None):
+            self.input_time = time.perf_counter()
+
+    # ends the named phase of the frame, which started at the previous mark
+    def mark(self, name):
+        if(not self.enabled):
+            return
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0) + (now - self.last_mark) * 1000
+        if(self.trace_path != None):
+            self.add_trace_event(name, self.last_mark, now)
+        self.last_mark = now
+        # the frame is on screen once it is drawn
+        if(name == "draw" and self.input_time != None):
+            self.latency_ms = (now - self.input_time) * 1000
+            self.input_time = None
+
+    # ends the frame, and draws the overlay onto screen if it is shown
+    def end_frame(self, screen):
+        if(not self.enabled):
+            return
+        now = time.perf_counter()
+        self.phases["frame"] = (now - self.frame_start) * 1000
+        self.phases["collisions"] = self.collisions
+        for name, value in self.phases.items():
+            self.totals[name] = self.totals.get(name, 0) + value
+        self.frames += 1
+        if(self.trace_path != None and len(self.trace) < MAX_TRACE_EVENTS):
+            self.trace.append({"name": "collisions", "ph": "C", "pid": 0, "tid": 0,
+                               "ts": now * 1e6, "args": {"calls": self.collisions}})
+        if(now - self.overlay_time >= OVERLAY_MS / 1000):
+            self.update_overlay_lines()
+            self.overlay_time = now
+        if(self.visible):
+            self.draw_overlay(screen)
+
+    # averages the phases of the frames since the last update into the overlay text
+    def update_overlay_lines(self):
+        frames = max(self.frames, 1)
+        average = {name: value / frames for name, value in self.totals.items()}
+        frame_ms = average.get("frame", 0)
+        # full_redraw is made of the other draw calls
+        draw_calls = sum(average.get(name, 0) for name in DRAW_CALLS if name != "full_redraw")
+        self.overlay_lines = [
+            "fps %5.1f  frame %5.2f ms" % (1000 / frame_ms if frame_ms > 0 else 0, frame_ms),
+            "events     %5.2f ms" % average.get("events", 0),
+            "simulation %5.2f ms" % average.get("simulation", 0),
+            "  collision %4.2f ms %4d" % (average.get("collision", 0), average.get("collisions", 0)),
+            "draw       %5.2f ms" % average.get("draw", 0),
+            "  playfield %4.2f ms" % average.get("draw_playfield", 0),
+            "  piece     %4.2f ms" % average.get("draw_current_piece", 0),
+            "  previews  %4.2f ms" % (average.get("draw_next_piece", 0)
+                                      + average.get("draw_hold_piece", 0)),
+            "  text      %4.2f ms" % average.get("draw_text", 0),
+            "  other     %4.2f ms" % max(0, average.get("draw", 0) - draw_calls),
+            "sleep      %5.2f ms" % average.get("sleep", 0),
+            "latency    %s" % ("%5.2f ms" % self.latency_ms if self.latency_ms != None else "-")
+        ]
+        self.totals = {}
+        self.frames = 0
+
+    # draws the overlay text in a box and updates that part of the display
+    def draw_overlay(self, screen):
+        height = fonts.get_font("profiler").get_linesize()
+        rect = pygame.Rect(self.renderer.layout.overlay_position, (OVERLAY_WIDTH, height * len(self.overlay_lines) + 8))
+        screen.fill((0, 0, 0), rect)
+        for k, line in enumerate(self.overlay_lines):
+            screen.blit(fonts.render(line, "profiler", (200, 200, 200)),
+                        (rect.x + 4, rect.y + 4 + k * height))
+        pygame.display.update(rect)
+        self.overlay_rect = rect
+
+    # writes the trace file, if there is one
+    def save(self):
+        if(self.trace_path == None):
+            return
+        with open(self.trace_path, "w") as trace_file:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, trace_file)
@@ -0,0 +1,498 @@
+# layered pygame renderer for a Game session
+# the background (labels, preview borders), the locked cells and the grid overlay are each kept
+# on their own cached surface, so a normal frame only redraws the active piece, the ghost piece,
+# changed previews and the stats, and only those regions are sent to the display
+
+import pygame, time
+
+# make sure pieces.py and fonts.py are in same directory for this to work
+import fonts
+from pieces import OFFSETS
+
+# define colours
+PIECE_COLOURS = [
+    (0, 0, 0),
+    (15, 155, 215),
+    (33, 65, 198),
+    (227, 91, 2),
+    (89, 177, 1),
+    (215, 15, 55),
+    (175, 41, 138),
+    (227, 159, 2),
+    # garbage
+    (120, 120, 120)
+]
+WHITE = (255, 255, 255)
+DARK_GREY = (50, 50, 50)
+LIGHT_GREY = (150, 150, 150)
+BACKGROUND = (10, 10, 20)
+# grid overlay pixels with this colour are transparent
+OVERLAY_KEY = (255, 0, 255)
+
+# labels of the stats under the playfield, the values are drawn with the digit atlas
+STAT_LABELS = ["Time: ", "Lines: ", "Pieces: "]
+
+# default size of a playfield cell in pixels
+SCALE = 30
+# smallest window, so the start and end messages always fit
+MIN_SCREEN_WIDTH = 640
+MIN_SCREEN_HEIGHT = 480
+
+# where everything is drawn, worked out from the board size and the cell size
+# the playfield is two cells in from the top left corner, the next and hold previews are
+# boxes one cell right of it and the stats are lines under it
+class Layout:
+    # initialize for a board of height by width cells, drawn scale pixels per cell
+    def __init__(self, height=20, width=10, scale=SCALE):
+        self.height = height
+        self.width = width
+        self.scale = scale
+        # top left of the playfield
+        self.x = scale * 2
+        self.y = scale * 2
+        # area covered by the playfield, including its border
+        self.board_rect = pygame.Rect(self.x - 2, self.y - 2, scale * width + 6, scale * height + 6)
+        # preview boxes are six cells wide with the piece in their middle four columns,
+        # the piece is drawn one row below the top of its box
+        self.box_x = self.x + scale * (width + 1)
+        self.box_width = scale * 6
+        self.preview_x = self.x + scale * (width + 2)
+        self.next_row = 1
+        self.hold_row = 8
+        # areas of the next and hold previews
+        self.next_rect = pygame.Rect(self.preview_x, self.y + scale * self.next_row, scale * 4, scale * 4)
+        self.hold_rect = pygame.Rect(self.preview_x, self.y + scale * self.hold_row, scale * 4, scale * 4)
+        self.screen_width = max(MIN_SCREEN_WIDTH, self.box_x + self.box_width + self.x)
+        self.screen_height = max(MIN_SCREEN_HEIGHT, self.y * 2 + scale * (height + len(STAT_LABELS)))
+        self.screen_size = (self.screen_width, self.screen_height)
+        # top of every stat line under the playfield, and the area it is drawn in
+        # the areas start where the playfield's border ends, so clearing them doesn't erase it
+        self.stat_y = [self.y + scale * (height + k) for k in range(0, len(STAT_LABELS))]
+        border = self.board_rect.bottom - self.stat_y[0]
+        self.stat_rects = [pygame.Rect(self.x, y + border, self.screen_width - self.x * 2, scale)
+                           for y in self.stat_y]
+        # free space under the hold preview and its label, used by the profiler overlay
+        self.overlay_position = (self.preview_x, self.y + scale * (self.hold_row + 4) + 20)
+
+# every cell colour pre-rendered once as a tile, with a darker ghost variant of each,
+# so cells are drawn with batched blits instead of one draw.rect call at a time
+class TileAtlas:
+    # renders a size by size tile for every colour, PIECE_COLOURS is indexed by playfield value
+    def __init__(self, colours, size):
+        self.size = size
+        self.tiles = []
+        self.ghosts = []
+        for colour in colours:
+            self.tiles.append(self.tile(colour))
+            # ghost pieces are half as bright
+            self.ghosts.append(self.tile((colour[0] // 2, colour[1] // 2, colour[2] // 2)))
+
+    # a tile filled with colour, in the display's pixel format so blitting it is a plain copy
+    def tile(self, colour):
+        surface = pygame.Surface((self.size, self.size)).convert()
+        surface.fill(colour)
+        return surface
+
+# cached drawing of one board, the locked cells are kept on their own surface and only drawn
+# again when a piece locks, the active piece and its ghost go over them
+class BoardView:
+    # initialize for boards of height by width cells drawn with the tiles of atlas
+    def __init__(self, height, width, atlas):
+        self.atlas = atlas
+        size = (atlas.size * width, atlas.size * height)
+        self.surface = pygame.Surface(size).convert()
+        self.cells = pygame.Surface(size).convert()
+        # finished games are shown darker
+        self.shade = pygame.Surface(size).convert()
+        self.shade.set_alpha(150)
+        # game, number of locks and piece position drawn last, None to draw again
+        self.drawn_game = None
+        self.drawn_locks = -1
+        self.drawn_state = None
+
+    # draws game onto the cached surface if anything changed since the last call
+    # returns whether it did
+    def draw(self, game):
+        board = game.board
+        piece = board.Piece
+        state = (board.locks, board.active,
+                 None if piece == None else (piece.type, piece.x, piece.y, piece.rotation))
+        if(game is self.drawn_game and state == self.drawn_state):
+            return False
+        scale = self.atlas.size
+        if(game is not self.drawn_game or board.locks != self.drawn_locks):
+            tiles = self.atlas.tiles
+            self.cells.fill(BACKGROUND)
+            self.cells.blits([(tiles[value], (scale * j, scale * i))
+                              for i, row in enumerate(board.playfield)
+                              for j, value in enumerate(row) if value > 0], False)
+            self.drawn_locks = board.locks
+        self.surface.blit(self.cells, (0, 0))
+        if(piece != None and board.active):
+            offsets = OFFSETS[piece.type][piece.rotation]
+            lowest = board.lowest_possible()
+            ghost = self.atlas.ghosts[piece.type + 1]
+            tile = self.atlas.tiles[piece.type + 1]
+            self.surface.blits([(ghost, (scale * (piece.x + j), scale * (lowest + i))) for j, i in offsets]
+                               + [(tile, (scale * (piece.x + j), scale * (piece.y + i))) for j, i in offsets],
+                               False)
+        if(not board.active):
+            self.surface.blit(self.shade, (0, 0))
+        self.drawn_game = game
+        self.drawn_state = state
+        return True
+
+class Renderer:
+    # initialize with the display surface and the cell size, layers are built when the first
+    # session is set
+    # without show_text no text is drawn, so the first frame doesn't have to wait for the fonts
+    def __init__(self, screen, scale=SCALE, show_text=True):
+        self.screen = screen
+        self.scale = scale
+        self.show_text = show_text
+        self.layout = None
+        self.session = None
+        self.game = None
+        # cached full screen layers
+        self.background = None
+        self.board_layer = None
+        self.overlay = None
+        # copy of the playfield rows that are drawn on board_layer
+        self.drawn_rows = []
+        # number of locked pieces drawn on board_layer, -1 to check every row
+        self.drawn_locks = -1
+        # regions of the active and ghost piece drawn last frame
+        self.piece_rects = []
+        # piece types shown in the previews last frame
+        self.drawn_next = None
+        self.drawn_hold = None
+        # stat values shown last frame, only changed ones are drawn again
+        self.drawn_stats = [None] * len(STAT_LABELS)
+        # when the current game started, for the timer
+        self.time_start = time.time()
+
+    # switches to a new game, static layers are only rebuilt if the board size changed
+    def set_session(self, session):
+        size = (session.board.width, session.board.height)
+        if(self.game == None or size != (self.game.width, self.game.height)):
+            self.game = session.board
+            self.layout = Layout(session.board.height, session.board.width, self.scale)
+            self.build_layers()
+        self.session = session
+        self.game = session.board
+        self.clear_board()
+        self.time_start = time.time()
+
+    # turns text on once the fonts are loaded, the layers are built again with the labels
+    def set_text(self, show_text):
+        self.show_text = show_text
+        if(self.layout != None):
+            self.build_layers()
+            self.clear_board()
+
+    # starts board_layer over from the background, every row and stat is drawn again
+    def clear_board(self):
+        self.drawn_stats = [None] * len(STAT_LABELS)
+        self.drawn_rows = [[0] * self.game.width for _ in range(self.game.height)]
+        self.drawn_locks = -1
+        self.board_layer.blit(self.background, (0, 0))
+
+    # pre-renders the layers that never change during a game
+    def build_layers(self):
+        layout = self.layout
+        self.background = pygame.Surface(layout.screen_size).convert()
+        self.background.fill(BACKGROUND)
+        self.draw_border(self.background, False)
+        if(self.show_text):
+            self.draw_labels(self.background)
+        # locked cells are drawn on a copy of the background
+        self.board_layer = self.background.copy()
+        # grid lines and playfield border go over the cells
+        self.overlay = pygame.Surface(layout.screen_size).convert()
+        self.overlay.fill(OVERLAY_KEY)
+        self.overlay.set_colorkey(OVERLAY_KEY)
+        self.draw_grid(self.overlay)
+        self.draw_border(self.overlay, True)
+        # glyphs for the stat values, so the ticking timer doesn't render a new surface every frame
+        self.digits = fonts.DigitAtlas("main", WHITE) if self.show_text else None
+        # tiles for the locked cells, the active and ghost piece and the previews
+        self.atlas = TileAtlas(PIECE_COLOURS, layout.scale)
+
+    # draws playfield grid
+    def draw_grid(self, surface):
+        layout = self.layout
+        scale = layout.scale
+        # vertical lines
+        for i in range(0, layout.width + 1):
+            pygame.draw.line(surface, DARK_GREY, (layout.x + scale * i + 1, layout.y + 1),
+                                                 (layout.x + scale * i + 1, layout.y + scale*layout.height), 1)
+        # horizontal lines
+        for j in range(0, layout.height + 1):
+            pygame.draw.line(surface, DARK_GREY, (layout.x + 1, layout.y + scale * j + 1),
+                                                 (layout.x + scale*layout.width, layout.y + scale * j + 1), 1)
+
+    # draws border around playfield, or around the next and hold previews
+    def draw_border(self, surface, playfield):
+        layout = self.layout
+        scale = layout.scale
+        if(playfield):
+            # horizontal lines
+            for offset in [0, scale * layout.width]:
+                pygame.draw.line(surface, LIGHT_GREY, (layout.x + offset + 1, layout.y + 1),
+                                                      (layout.x + offset + 1, layout.y + scale*layout.height), 2)
+            # vertical lines
+            for offset in [0, scale * layout.height]:
+                pygame.draw.line(surface, LIGHT_GREY, (layout.x + 1, layout.y + offset + 1),
+                                                      (layout.x + scale*layout.width, layout.y + offset + 1), 2)
+            return
+        # draw next piece border and hold piece border, each starts a row above its piece
+        # horizontal lines
+        for row in [layout.next_row, layout.hold_row]:
+            top = layout.y + scale * (row - 1)
+            for offset in [0, layout.box_width]:
+                pygame.draw.line(surface, LIGHT_GREY, (layout.box_x + offset, top + 1),
+                                                      (layout.box_x + offset, top + scale*4 + 1), 2)
+            # vertical lines
+            for offset in [0, scale*4]:
+                pygame.draw.line(surface, LIGHT_GREY, (layout.box_x, top + offset + 1),
+                                                      (layout.box_x + layout.box_width, top + offset + 1), 2)
+
+    # draws the title and the preview labels, these never change
+    def draw_labels(self, surface):
+        layout = self.layout
+        scale = layout.scale
+        # have to render first then blit in pygame
+        title_text = fonts.render("Max's Tetris Game", "main", WHITE)
+        next_text = fonts.render("Next Piece", "main", WHITE)
+        hold_text = fonts.render("Hold Piece", "main", WHITE)
+        # blit based on scale, the labels are centred under their boxes
+        centre = layout.box_x + layout.box_width // 2
+        surface.blit(next_text, next_text.get_rect(midtop=(centre, layout.y + scale*(layout.next_row + 3) + 5)))
+        surface.blit(hold_text, hold_text.get_rect(midtop=(centre, layout.y + scale*(layout.hold_row + 3) + 5)))
+        surface.blit(title_text, title_text.get_rect(midtop=(layout.screen_width // 2, layout.y // 3)))
+
+    # draw current piece and ghost piece onto the screen
+    def draw_current_piece(self):
+        game = self.game
+        layout = self.layout
+        scale = layout.scale
+        lowest_possible = game.lowest_possible()
+        offsets = OFFSETS[game.Piece.type][game.Piece.rotation]
+        x = layout.x + scale * game.Piece.x + 1
+        # draw ghost piece, which is darker than the actual piece, then the current piece over it
+        ghost = self.atlas.ghosts[game.Piece.type + 1]
+        tile = self.atlas.tiles[game.Piece.type + 1]
+        self.screen.blits([(ghost, (x + scale * j, layout.y + scale * (i + lowest_possible) + 1))
+                           for j, i in offsets]
+                          + [(tile, (x + scale * j, layout.y + scale * (i + game.Piece.y) + 1))
+                             for j, i in offsets], False)
+
+    # regions covered by the current piece and its ghost piece
+    def current_piece_rects(self):
+        game = self.game
+        layout = self.layout
+        scale = layout.scale
+        rects = []
+        for y in (game.Piece.y, game.lowest_possible()):
+            rect = pygame.Rect(layout.x + scale * game.Piece.x + 1, layout.y + scale * y + 1,
+                               scale * 4, scale * 4)
+            rects.append(rect.clip(layout.board_rect))
+        return rects
+
+    # draws the rows of the playfield that changed since the last call onto board_layer
+    # returns whether anything changed
+    def draw_playfield(self):
+        game = self.game
+        # locked cells only change when a piece locks
+        if(game.locks == self.drawn_locks):
+            return False
+        rows = range(0, game.height)
+        # after a single lock, only the rows of the piece changed, or everything above the
+        # lowest cleared row if it cleared lines
+        if(game.locks == self.drawn_locks + 1 and game.last_clear != None):
+            if(game.last_clear.lines > 0):
+                rows = range(0, game.last_clear.rows[-1] + 1)
+            else:
+                rows = game.locked_rows
+        self.drawn_locks = game.locks
+        layout = self.layout
+        scale = layout.scale
+        tiles = self.atlas.tiles
+        # cells of every changed row, blitted together once the rows are cleared
+        cells = []
+        changed = False
+        for i in rows:
+            if(game.playfield[i] == self.drawn_rows[i]):
+                continue
+            changed = True
+            row_rect = pygame.Rect(layout.x + 1, layout.y + scale * i + 1, scale * game.width, scale)
+            self.board_layer.blit(self.background, row_rect, row_rect)
+            # if game.playfield > 0, then there is a piece there
+            # playfield has colour information (bound to piece type)
+            cells += [(tiles[value], (layout.x + scale * j + 1, row_rect.y))
+                      for j, value in enumerate(game.playfield[i]) if value > 0]
+            self.drawn_rows[i] = game.playfield[i][:]
+        if(len(cells) > 0):
+            self.board_layer.blits(cells, False)
+        return changed
+
+    # draws a preview of a piece in its default rotation, at the given row of the preview column
+    def draw_preview(self, piece_type, row):
+        layout = self.layout
+        scale = layout.scale
+        # the default rotation of the piece, using piece colour based on type
+        tile = self.atlas.tiles[piece_type + 1]
+        self.screen.blits([(tile, (layout.preview_x + scale * j, layout.y + scale * (i + row)))
+                           for j, i in OFFSETS[piece_type][0]], False)
+
+    # draw next piece preview
+    def draw_next_piece(self):
+        # next piece is at the front of the session's bag
+        self.drawn_next = self.session.next_piece()
+        self.screen.blit(self.background, self.layout.next_rect, self.layout.next_rect)
+        self.draw_preview(self.drawn_next, self.layout.next_row)
+
+    # draws hold piece, can be nothing
+    def draw_hold_piece(self):
+        self.drawn_hold = self.session.hold_piece
+        self.screen.blit(self.background, self.layout.hold_rect, self.layout.hold_rect)
+        if(self.drawn_hold != None):
+            self.draw_preview(self.drawn_hold, self.layout.hold_row)
+
+    # draws the stats under the playfield whose values changed, or all of them if forced
+    # returns the regions that were drawn
+    def draw_text(self, force=False):
+        if(not self.show_text):
+            return []
+        game = self.game
+        # draw some statistics, elapsed time is rounded to 2 significant figures
+        stats = [str(round(time.time() - self.time_start, 2)),
+                 str(game.lines_cleared),
+                 str(self.session.pieces_placed)]
+        dirty = []
+        for k in range(0, len(STAT_LABELS)):
+            if(not force and stats[k] == self.drawn_stats[k]):
+                continue
+            rect = self.layout.stat_rects[k]
+            self.screen.blit(self.background, rect, rect)
+            label = fonts.render(STAT_LABELS[k], "main", WHITE)
+            self.screen.blit(label, (rect.x + 10, self.layout.stat_y[k] + 5))
+            self.digits.draw(self.screen, stats[k], (rect.x + 10 + label.get_width(), self.layout.stat_y[k] + 5))
+            self.drawn_stats[k] = stats[k]
+            dirty.append(rect)
+        return dirty
+
+    # displays message at the center of the screen
+    def display_message(self, message, y, bold):
+        if(not self.show_text):
+            return
+        display_text = fonts.render(message, "title" if bold else "message", WHITE)
+        display_position = display_text.get_rect(center = (self.layout.screen_width/2, self.layout.screen_height/2 + y))
+        self.screen.blit(display_text, display_position)
+
+    # draws a see-through box for the start and end messages
+    def draw_rectangle(self):
+        width, height = self.layout.screen_size
+        # size of rectangle
+        rectangle_surface = pygame.Surface((9*width/10, 3*height/10))
+        # transparency
+        rectangle_surface.set_alpha(220)
+        # fill entire surface
+        rectangle_surface.fill((0,0,0))
+        # defined using top left coordinates
+        self.screen.blit(rectangle_surface, (width/20, 3.5*height/10))
+        # defined using top left coordinates and height/width
+        pygame.draw.rect(self.screen, (200,200,200), pygame.Rect(width/20, 3.5*height/10,
+                                                                 9*width/10, 3*height/10), 5)
+
+    # draws at the beginning of each game, instructions
+    def draw_start_text(self):
+        self.display_message("Pygame Tetris!", -70, True)
+        self.display_message("Arrow keys to move, space to drop.", -22, False)
+        self.display_message("A/S to rotate, C to hold.", 10, False)
+        self.display_message("Clear 40 lines to win.", 42, False)
+        self.display_message("Press any key to begin.", 74, False)
+
+    # draws at game over (player wins or loses)
+    def draw_end_text(self):
+        self.display_message("Game Over!", -20, True)
+        self.display_message("Press R to restart.", 25, False)
+
+    # draws all parts of the game, piece_active is false when intializing the game
+    # the caller is responsible for updating the whole display
+    def full_redraw(self, piece_active):
+        self.draw_playfield()
+        self.screen.blit(self.board_layer, (0, 0))
+        self.piece_rects = []
+        if(piece_active):
+            self.draw_current_piece()
+            self.piece_rects = self.current_piece_rects()
+        self.screen.blit(self.overlay, (0, 0))
+        self.draw_next_piece()
+        self.draw_hold_piece()
+        self.draw_text(True)
+
+    # draws one frame while a piece is active, only updating the regions that changed
+    def render(self):
+        dirty = []
+        if(self.draw_playfield()):
+            # locked cells changed, the whole playfield is recomposed
+            rects = [self.layout.board_rect]
+            new_rects = self.current_piece_rects()
+        else:
+            # only where the active and ghost piece were and are now
+            new_rects = self.current_piece_rects()
+            rects = self.piece_rects + new_rects
+        for rect in rects:
+            self.screen.blit(self.board_layer, rect, rect)
+        self.draw_current_piece()
+        for rect in rects:
+            self.screen.blit(self.overlay, rect, rect)
+        self.piece_rects = new_rects
+        dirty += rects
+        # previews only change when a piece spawns or is held
+        if(self.session.next_piece() != self.drawn_next):
+            self.draw_next_piece()
+            dirty.append(self.layout.next_rect)
+        if(self.session.hold_piece != self.drawn_hold):
+            self.draw_hold_piece()
+            dirty.append(self.layout.hold_rect)
+        dirty += self.draw_text()
+        pygame.display.update(dirty)
+        return dirty
+
+# renderer for games played without a window, draws nothing
+# it has the same draw calls as Renderer, so the profiler can time them the same way
+class HeadlessRenderer:
+    def __init__(self):
+        self.layout = None
+        self.session = None
+        self.game = None
+        self.show_text = False
+        self.time_start = time.time()
+
+    def set_session(self, session):
+        self.session = session
+        self.game = session.board
+        self.time_start = time.time()
+
+    def draw_playfield(self):
+        return False
+
+    def draw_current_piece(self):
+        pass
+
+    def draw_next_piece(self):
+        pass
+
+    def draw_hold_piece(self):
+        pass
+
+    def draw_text(self, force=False):
+        return []
+
+    def full_redraw(self, piece_active):
+        pass
+
+    def render(self):
+        return []
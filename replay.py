@@ -0,0 +1,159 @@
+# recording and replaying games
+# a game is fully determined by its seed, its settings and the tick every action was applied on,
+# so a replay file is one json header line followed by one line of "<ticks since last action><code>"
+# tokens, and replaying re-simulates it on the headless engine as fast as possible
+# garbage received in versus games is logged too, its token ends with the number of lines
+#
+# usage: python replay.py FILE [FILE ...]
+
+import argparse, json, re, time
+
+from boards import BOARDS
+from engine import Game, Tetris, TICK_MS
+from engine import LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP, HARD_DROP, RESIGN, GARBAGE
+
+# bumped whenever a rules change would make old replays play out differently
+VERSION = 3
+
+# one letter per action in the replay file
+ACTION_CODES = {
+    LEFT: "L",
+    RIGHT: "R",
+    ROTATE_CW: "A",
+    ROTATE_CCW: "S",
+    HOLD: "C",
+    SOFT_DROP: "D",
+    HARD_DROP: "H",
+    RESIGN: "X",
+    GARBAGE: "G"
+}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+# ticks, code and the lines of garbage tokens
+TOKEN = re.compile(r"(\d+)([A-Z])(\d*)")
+
+# settings of a game and the state it is in, everything needed to play it again
+def make_header(game):
+    return {
+        "version": VERSION,
+        "seed": game.seed,
+        "height": game.board.height,
+        "width": game.board.width,
+        "tick_ms": TICK_MS,
+        "gravity_ms": game.gravity_ms,
+        "lock_delay_ms": game.lock_delay_ms,
+        # final state, to check that a replay didn't desync
+        "ticks": game.ticks,
+        "lines": game.board.lines_cleared,
+        "pieces": game.pieces_placed
+    }
+
+# writes a recorded game (see Game.record) to path
+def save(game, path):
+    with open(path, "w") as replay_file:
+        replay_file.write(json.dumps(make_header(game)) + "\n")
+        replay_file.write(encode(game.log) + "\n")
+
+# log entries as a line of tokens, ticks are counted from previous
+def encode(log, previous=0):
+    tokens = []
+    for entry in log:
+        tokens.append(str(entry[0] - previous) + ACTION_CODES[entry[1]]
+                      + (str(entry[2]) if len(entry) > 2 else ""))
+        previous = entry[0]
+    return " ".join(tokens)
+
+# a line of tokens back to log entries, ticks are counted from tick
+def decode(line, tick=0):
+    log = []
+    for token in line.split():
+        match = TOKEN.fullmatch(token)
+        if(match == None):
+            raise ValueError("bad replay token: " + token)
+        tick += int(match.group(1))
+        if(match.group(3) != ""):
+            log.append((tick, CODE_ACTIONS[match.group(2)], int(match.group(3))))
+        else:
+            log.append((tick, CODE_ACTIONS[match.group(2)]))
+    return log
+
+# reads a replay file, returns its header and the list of (tick, action)
+def load(path):
+    with open(path) as replay_file:
+        header = json.loads(replay_file.readline())
+        line = replay_file.readline()
+    if(header["version"] != VERSION or header["tick_ms"] != TICK_MS):
+        raise ValueError("replay was recorded with different rules: " + path)
+    return header, decode(line)
+
+# creates the game a replay starts from
+def new_game(header, board=Tetris):
+    return Game(header["seed"], header["height"], header["width"], board,
+                header["gravity_ms"], header["lock_delay_ms"])
+
+# plays back a replay one tick per call to step
+# the caller decides how fast ticks happen, headless replays just run through them
+class Player:
+    def __init__(self, header, log, board=Tetris):
+        self.header = header
+        self.log = log
+        self.game = new_game(header, board)
+        # index of the next action in the log
+        self.position = 0
+
+    # whether there is anything left to play
+    @property
+    def finished(self):
+        if(not self.game.active):
+            return True
+        return self.game.ticks >= self.header["ticks"] and self.position >= len(self.log)
+
+    # applies every action recorded for the current tick and advances one tick
+    # returns the events, like Game.step
+    def step(self):
+        events = []
+        while(self.position < len(self.log) and self.log[self.position][0] == self.game.ticks):
+            entry = self.log[self.position]
+            if(entry[1] == GARBAGE):
+                self.game.receive_garbage(entry[2])
+            else:
+                events += self.game.apply(entry[1])
+            self.position += 1
+        if(self.game.active and self.game.ticks < self.header["ticks"]):
+            events += self.game.step()
+        return events
+
+# re-simulates a replay headless and returns the final game
+def replay(path, board=Tetris):
+    header, log = load(path)
+    player = Player(header, log, board)
+    while(not player.finished):
+        player.step()
+    return player.game
+
+# whether a replayed game ended in the same state as when it was recorded
+def matches(header, game):
+    return (game.ticks == header["ticks"] and game.board.lines_cleared == header["lines"]
+            and game.pieces_placed == header["pieces"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-simulate recorded tetris games headless.")
+    parser.add_argument("files", nargs="+", help="replay files written by tetris.py --record")
+    parser.add_argument("--board", choices=sorted(BOARDS), default="list")
+    args = parser.parse_args()
+
+    desyncs = 0
+    for path in args.files:
+        header, _ = load(path)
+        start = time.perf_counter()
+        game = replay(path, BOARDS[args.board])
+        elapsed = time.perf_counter() - start
+        ok = matches(header, game)
+        desyncs += not ok
+        print("%s: %d lines, %d pieces, %.2fs of play in %.3fs (%.0fx real time)%s" % (
+            path, game.board.lines_cleared, game.pieces_placed, game.time / 1000, elapsed,
+            game.time / 1000 / max(elapsed, 1e-9), "" if ok else ", DESYNC"))
+    if(desyncs > 0):
+        raise SystemExit("%d of %d replays desynced" % (desyncs, len(args.files)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# headless self-play runner
+# fans games out over a process pool, every game runs on its own engine with its own
+# 7-bag seed, results are streamed to one jsonl file per shard and merged at the end
+#
+# usage: python runner.py --games 1000 --workers 8 --seed 0 --out results
+
+import argparse, json, multiprocessing, os, random, time
+
+from boards import BOARDS
+from bot import Bot
+from engine import Game, LEFT, RIGHT, ROTATE_CW, HARD_DROP, LINES_TO_WIN
+
+# picks a random rotation and column for the current piece, returns the actions to get there
+def random_policy(game, rng):
+    actions = [ROTATE_CW] * rng.randrange(0, 4)
+    shift = rng.randrange(-(game.board.width // 2), game.board.width // 2 + 1)
+    actions += [LEFT if shift < 0 else RIGHT] * abs(shift)
+    actions.append(HARD_DROP)
+    return actions
+
+# places the current piece where the bot's search finds best
+# every game gets its own bot, so its caches and their counters don't depend on the games
+# played before it in the same worker
+class BotPolicy:
+    def __init__(self):
+        # no time budget, so results don't depend on how busy the machine is
+        self.bot = Bot(time_budget_ms=None)
+
+    def __call__(self, game, rng):
+        return self.bot.actions(game)
+
+# hits, misses and evictions of the bot's caches
+def cache_counts(bot):
+    return {name: {key: stats[key] for key in ("hits", "misses", "evictions")}
+            for name, stats in bot.cache_stats().items()}
+
+# policies selectable from the command line, each makes the policy for one game,
+# which maps (game, rng) to a list of actions
+POLICIES = {
+    "random": lambda: random_policy,
+    "bot": BotPolicy
+}
+
+# plays one game to the end and returns its result
+def play_game(seed, policy, board, max_pieces):
+    game = Game(seed, board=board)
+    # the policy gets its own generator so its choices don't change the bag
+    rng = random.Random(seed)
+    time_to_40 = None
+    start = time.perf_counter()
+    while(game.active and game.pieces_placed < max_pieces):
+        placed = game.pieces_placed
+        for action in policy(game, rng):
+            game.step(action)
+            # stop early if gravity already locked the piece
+            if(game.pieces_placed != placed or not game.active):
+                break
+        if(time_to_40 == None and game.board.lines_cleared >= LINES_TO_WIN):
+            time_to_40 = game.time / 1000
+    return {
+        "seed": seed,
+        "lines": game.board.lines_cleared,
+        "pieces": game.pieces_placed,
+        "score": game.score,
+        "clears": game.clears,
+        "won": game.won,
+        # game time in seconds, every step is engine.TICK_MS long
+        "time": game.time / 1000,
+        "time_to_40": time_to_40,
+        "wall_time": time.perf_counter() - start
+    }
+
+# path of the results file written by one shard
+def shard_path(out, shard):
+    return os.path.join(out, "shard-%04d.jsonl" % shard)
+
+# runs every game of one shard in a worker process, streaming one line per game
+def run_shard(task):
+    shard, seeds, policy_name, board_name, max_pieces, out = task
+    board = BOARDS[board_name]
+    with open(shard_path(out, shard), "w") as results:
+        for seed in seeds:
+            policy = POLICIES[policy_name]()
+            result = play_game(seed, policy, board, max_pieces)
+            if(isinstance(policy, BotPolicy)):
+                result["cache"] = cache_counts(policy.bot)
+            results.write(json.dumps(result) + "\n")
+            results.flush()
+    return shard
+
+# reads every shard file in out and combines the results into one summary
+def merge_shards(out):
+    results = []
+    for name in sorted(os.listdir(out)):
+        if(name.startswith("shard-") and name.endswith(".jsonl")):
+            with open(os.path.join(out, name)) as shard:
+                results += [json.loads(line) for line in shard if line.strip()]
+    summary = {"games": len(results)}
+    if(len(results) == 0):
+        return summary
+    wins = [result["time_to_40"] for result in results if result["time_to_40"] != None]
+    summary["wins"] = len(wins)
+    summary["lines_total"] = sum(result["lines"] for result in results)
+    summary["lines_mean"] = summary["lines_total"] / len(results)
+    summary["lines_max"] = max(result["lines"] for result in results)
+    summary["pieces_total"] = sum(result["pieces"] for result in results)
+    summary["pieces_mean"] = summary["pieces_total"] / len(results)
+    summary["time_to_40_mean"] = sum(wins) / len(wins) if wins else None
+    summary["time_to_40_best"] = min(wins) if wins else None
+    summary["wall_time_total"] = sum(result["wall_time"] for result in results)
+    # the bot's cache counters over every game, only games played by the bot have them
+    caches = [result["cache"] for result in results if "cache" in result]
+    if(len(caches) > 0):
+        summary["cache"] = {}
+        for name in caches[0]:
+            counts = {key: sum(cache[name][key] for cache in caches) for key in caches[0][name]}
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups > 0 else 0
+            summary["cache"][name] = counts
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless tetris games in parallel.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="number of result files, defaults to one per worker")
+    parser.add_argument("--seed", type=int, default=0, help="game i is played with seed + i")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--board", choices=sorted(BOARDS), default="list")
+    parser.add_argument("--max-pieces", type=int, default=10000,
+                        help="stop a game after this many pieces")
+    parser.add_argument("--out", default="results", help="directory for the shard files")
+    args = parser.parse_args()
+
+    shards = args.shards or args.workers
+    os.makedirs(args.out, exist_ok=True)
+    # remove old shards so the merge only sees this run
+    for name in os.listdir(args.out):
+        if(name.startswith("shard-") and name.endswith(".jsonl")):
+            os.remove(os.path.join(args.out, name))
+    seeds = [args.seed + i for i in range(args.games)]
+    tasks = [(shard, seeds[shard::shards], args.policy, args.board, args.max_pieces, args.out)
+             for shard in range(shards)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for shard in pool.imap_unordered(run_shard, tasks):
+            print("shard %d done" % shard)
+    summary = merge_shards(args.out)
+    summary["elapsed"] = time.perf_counter() - start
+    with open(os.path.join(args.out, "summary.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# spectator view
+# plays many games at once, by default with the bot, and tiles them all in one window
+# every board is drawn on its own cached surface that is only redrawn when its game changed,
+# and the games only get a fixed share of every frame to step and plan in, so the frame rate
+# stays stable with dozens of boards, games that don't get their turn fall behind instead
+#
+# usage: python spectator.py --games 24 [--policy random] [--height 20 --width 10]
+
+import argparse, math, pygame, random, time
+
+# make sure engine.py, bot.py, runner.py and renderer.py are in same directory for this to work
+import fonts
+from bot import Bot
+from engine import Game, TICK_MS
+from renderer import BoardView, TileAtlas, PIECE_COLOURS, BACKGROUND, LIGHT_GREY, WHITE
+from boards import BOARDS
+from runner import random_policy
+
+# the screen is redrawn at most FPS times per second
+FPS = 60
+# milliseconds of every frame the games can use to step and plan, the rest is for drawing
+SIMULATION_MS = 8
+# most game time one game catches up in a frame, so a game that missed its turn doesn't jump
+MAX_FRAME_MS = 250
+# every game applies one of its planned actions every ACTION_MS
+ACTION_MS = 50
+# time a finished game stays on screen before a new one starts in its place
+RESTART_MS = 3000
+# the spectator bot searches for at most this long per piece, so one plan fits in a frame
+BOT_BUDGET_MS = 5
+# pixels between boards and the height of the text line under every board
+GAP = 8
+LABEL_HEIGHT = 16
+WINDOW_SIZE = (1280, 720)
+
+# cell size and number of columns that fit n boards in window as large as possible
+def fit(n, height, width, window):
+    best = (0, 1)
+    for columns in range(1, n + 1):
+        rows = math.ceil(n / columns)
+        scale = min((window[0] // columns - GAP) // width,
+                    (window[1] // rows - GAP - LABEL_HEIGHT) // height)
+        if(scale > best[0]):
+            best = (scale, columns)
+    return best
+
+# one tile of the spectator window: a game, the policy playing it and its cached drawing
+class Spectated:
+    # initialize with the first seed of the tile, the seeds of later games step by stride
+    def __init__(self, seed, stride, args, policy, view):
+        self.seed = seed
+        self.stride = stride
+        self.args = args
+        self.policy = policy
+        self.view = view
+        self.drawn_label = None
+        self.start(seed)
+
+    # starts a new game on this tile
+    def start(self, seed):
+        self.seed = seed
+        self.game = Game(seed, self.args.height, self.args.width, BOARDS[self.args.board])
+        # the policy gets its own generator so its choices don't change the bag
+        self.rng = random.Random(seed)
+        self.plan = []
+        self.planned_piece = -1
+        self.action_timer = 0
+        self.finished_timer = 0
+        # game time owed to this game, stepped when it gets its turn
+        self.accumulator = 0
+
+    # runs every fixed step this game is owed, like the main loop of tetris.py does for the bot
+    def advance(self):
+        while(self.accumulator >= TICK_MS):
+            self.accumulator -= TICK_MS
+            if(not self.game.active):
+                self.finished_timer += TICK_MS
+                if(self.finished_timer >= RESTART_MS):
+                    self.start(self.seed + self.stride)
+                continue
+            self.action_timer += TICK_MS
+            if(self.action_timer >= ACTION_MS):
+                self.action_timer -= ACTION_MS
+                if(self.planned_piece != self.game.pieces_placed):
+                    self.plan = self.policy(self.game, self.rng)
+                    self.planned_piece = self.game.pieces_placed
+                if(len(self.plan) > 0):
+                    self.game.apply(self.plan.pop(0))
+            self.game.step()
+
+    # text under the board
+    def label(self):
+        if(self.game.won):
+            result = " won"
+        elif(not self.game.active):
+            result = " lost"
+        else:
+            result = ""
+        return "#%d  %d lines%s" % (self.seed, self.game.board.lines_cleared, result)
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch many tetris games at once.")
+    parser.add_argument("--games", type=int, default=24, help="number of games shown")
+    parser.add_argument("--policy", choices=["bot", "random"], default="bot")
+    parser.add_argument("--board", choices=sorted(BOARDS), default="list")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--height", type=int, default=20, help="rows of every playfield")
+    parser.add_argument("--width", type=int, default=10, help="columns of every playfield")
+    parser.add_argument("--window", type=int, nargs=2, default=WINDOW_SIZE, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--speed", type=float, default=1, help="game time per real time")
+    args = parser.parse_args()
+    if(args.height < 4 or args.width < 4):
+        parser.error("the playfield must be at least 4x4")
+    scale, columns = fit(args.games, args.height, args.width, args.window)
+    if(scale < 2):
+        parser.error("%d games don't fit in a %dx%d window" % (args.games, args.window[0], args.window[1]))
+
+    if(args.policy == "bot"):
+        # one bot plays every game, its caches are shared between them
+        bot = Bot(time_budget_ms=BOT_BUDGET_MS)
+        policy = lambda game, rng: bot.actions(game)
+    else:
+        policy = random_policy
+
+    pygame.init()
+    screen = pygame.display.set_mode(args.window)
+    pygame.display.set_caption("Tetris")
+    pygame.display.set_icon(pygame.image.load("icon.png"))
+    fonts.load_fonts()
+    atlas = TileAtlas(PIECE_COLOURS, scale)
+    tile_width = scale * args.width + GAP
+    tile_height = scale * args.height + GAP + LABEL_HEIGHT
+    spectated = []
+    positions = []
+    for k in range(0, args.games):
+        view = BoardView(args.height, args.width, atlas)
+        spectated.append(Spectated(args.seed + k, args.games, args, policy, view))
+        positions.append((GAP + (k % columns) * tile_width, GAP + (k // columns) * tile_height))
+    # background with a border around every board
+    screen.fill(BACKGROUND)
+    for x, y in positions:
+        pygame.draw.rect(screen, LIGHT_GREY, (x - 2, y - 2, scale * args.width + 4, scale * args.height + 4), 1)
+    pygame.display.update()
+
+    clock = pygame.time.Clock()
+    # game that gets the first turn next frame, so every game gets its turn when time runs short
+    turn = 0
+    running = True
+    while(running):
+        elapsed = clock.tick(FPS)
+        for event in pygame.event.get():
+            if(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE)):
+                running = False
+        for tile in spectated:
+            tile.accumulator = min(tile.accumulator + elapsed * args.speed, MAX_FRAME_MS)
+        deadline = time.perf_counter() + SIMULATION_MS / 1000
+        for k in range(0, len(spectated)):
+            spectated[(turn + k) % len(spectated)].advance()
+            if(time.perf_counter() >= deadline):
+                break
+        turn = (turn + k + 1) % len(spectated)
+        # only the boards and labels that changed are sent to the display
+        dirty = []
+        for tile, (x, y) in zip(spectated, positions):
+            if(tile.view.draw(tile.game)):
+                dirty.append(screen.blit(tile.view.surface, (x, y)))
+            label = tile.label()
+            if(label != tile.drawn_label):
+                rect = pygame.Rect(x, y + scale * args.height + 2, scale * args.width, LABEL_HEIGHT)
+                screen.fill(BACKGROUND, rect)
+                screen.blit(fonts.render(label, "small", WHITE), rect)
+                tile.drawn_label = label
+                dirty.append(rect)
+        pygame.display.update(dirty)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
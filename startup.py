@@ -0,0 +1,85 @@
+# startup timing and background loading
+# finding the system fonts (fc-list on linux), opening the audio device and decoding every sound
+# effect are the slow parts of starting the game, and the first frame needs none of them, so they
+# are loaded on a thread while the start screen is already up. Most of that time is spent waiting
+# on other processes, the disk and the audio device, so the main thread keeps going meanwhile
+
+import threading, time
+
+# runs loading functions in order on a background thread, their results are picked up by name
+class Preloader:
+    # starts running tasks, a list of (name, function)
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.results = {}
+        self.ready = {name: threading.Event() for name, _ in tasks}
+        self.error = None
+        # milliseconds every task took, and how long the main thread waited for results
+        self.times = {}
+        self.waited_ms = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            for name, task in self.tasks:
+                start = time.perf_counter()
+                self.results[name] = task()
+                self.times[name] = (time.perf_counter() - start) * 1000
+                self.ready[name].set()
+        except Exception as error:
+            self.error = error
+            # nothing after it gets loaded, so nobody waits forever
+            for event in self.ready.values():
+                event.set()
+
+    # whether the named task has finished
+    def done(self, name):
+        return self.ready[name].is_set()
+
+    # result of the named task, waits for it if it is still loading
+    def get(self, name):
+        if(not self.done(name)):
+            start = time.perf_counter()
+            self.ready[name].wait()
+            self.waited_ms += (time.perf_counter() - start) * 1000
+        if(self.error != None):
+            raise self.error
+        return self.results[name]
+
+    # waits for every task, pygame can't be quit while the thread is still using it
+    def join(self):
+        self.thread.join()
+
+# times the phases of startup, up to the first frame on screen
+class StartupTimer:
+    # initialize with the time.perf_counter() the program started at
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        # (name, start, end) of every phase, in time.perf_counter() seconds
+        self.phases = []
+        self.first_frame_ms = None
+
+    # ends the named phase, which started where the previous one ended
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, self.last, now))
+        self.last = now
+
+    # the first frame is on screen, only the first call counts
+    def first_frame(self):
+        if(self.first_frame_ms == None):
+            self.mark("first frame")
+            self.first_frame_ms = (self.last - self.started) * 1000
+
+    # one line summary, with what the preloader loaded in the meantime
+    def report(self, preloader=None):
+        if(self.first_frame_ms == None):
+            return "startup: no frame was shown"
+        text = "startup: first frame after %.0f ms (%s)" % (self.first_frame_ms, ", ".join(
+            "%s %.0f" % (name, (end - start) * 1000) for name, start, end in self.phases))
+        if(preloader != None and len(preloader.tasks) > 0):
+            text += ", loaded in the background: %s, waited %.0f ms for it" % (", ".join(
+                "%s %.0f ms" % item for item in preloader.times.items()), preloader.waited_ms)
+        return text
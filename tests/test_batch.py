@@ -0,0 +1,92 @@
+# the vectorized environment in batch.py has to follow the same rules as Game, so both are
+# played in lockstep with the same pieces and compared after every step
+
+import random, unittest
+
+import numpy as np
+
+from batch import BatchTetris, ACTION_CODES, NO_ACTION
+from engine import Game, LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP, HARD_DROP
+
+# number of boards played side by side
+BOARDS = 32
+# actions are rare enough that pieces also rest on the stack and lock by themselves
+ACTIONS = [LEFT, RIGHT, LEFT, RIGHT, ROTATE_CW, ROTATE_CCW, HOLD, SOFT_DROP] + [None] * 30
+
+class LockstepTest(unittest.TestCase):
+    # games with seeds 0 to BOARDS - 1 and a batch playing the same pieces
+    def start(self):
+        games = [Game(seed) for seed in range(0, BOARDS)]
+        batch = BatchTetris(BOARDS, seed=0)
+        self.sync_queues(batch, games)
+        batch.spawn(np.ones(BOARDS, dtype=bool), np.array([game.board.Piece.type for game in games]))
+        return games, batch
+
+    # the batch draws its bags from its own generator, so every board takes its upcoming pieces
+    # from its game, at most one piece is spawned per board between two calls
+    def sync_queues(self, batch, games):
+        for i, game in enumerate(games):
+            batch.queue[i, :7] = game.queue[:7]
+        batch.queue_position[:] = 0
+
+    def assert_same(self, batch, games, when):
+        for i, game in enumerate(games):
+            message = "board %d %s" % (i, when)
+            self.assertEqual(bool(batch.active[i]), game.active, message)
+            self.assertEqual(batch.boards[i].tolist(), game.board.playfield, message)
+            self.assertEqual(int(batch.lines_cleared[i]), game.board.lines_cleared, message)
+            self.assertEqual(int(batch.pieces_placed[i]), game.pieces_placed, message)
+            if(not game.active):
+                continue
+            piece = game.board.Piece
+            self.assertEqual((int(batch.piece_type[i]), int(batch.x[i]), int(batch.y[i]),
+                              int(batch.rotation[i])),
+                             (piece.type, piece.x, piece.y, piece.rotation), message)
+            held = -1 if game.hold_piece == None else game.hold_piece
+            self.assertEqual((int(batch.hold_piece[i]), bool(batch.hold_used[i])),
+                             (held, game.hold_used), message)
+            self.assertEqual((int(batch.lock_timer[i]), int(batch.lock_resets[i])),
+                             (game.lock_timer, game.lock_resets), message)
+
+    # random actions every tick, holding included
+    def test_step(self):
+        games, batch = self.start()
+        rng = random.Random(0)
+        for tick in range(0, 3000):
+            actions = [rng.choice(ACTIONS) for _ in games]
+            batch.step([NO_ACTION if action == None else ACTION_CODES[action] for action in actions])
+            for game, action in zip(games, actions):
+                if(game.active):
+                    game.step(action)
+            self.assert_same(batch, games, "after tick %d" % tick)
+            self.sync_queues(batch, games)
+            if(not batch.active.any()):
+                break
+
+    # place turns the piece and moves it straight to (rotation, x) before dropping it, so the
+    # game gets the same placement only where the piece fits there as it is
+    def test_place(self):
+        games, batch = self.start()
+        rng = random.Random(1)
+        for turn in range(0, 200):
+            rotations = [rng.randrange(0, 4) for _ in games]
+            columns = [rng.randrange(-2, 10) for _ in games]
+            valid = batch.place(np.array(rotations), np.array(columns))
+            for i, game in enumerate(games):
+                if(not game.active):
+                    continue
+                board = game.board
+                rotation = rotations[i] % len(board.Piece.pieces[board.Piece.type])
+                fits = board.fits(columns[i], board.Piece.y, rotation)
+                self.assertEqual(bool(valid[i]), fits, "board %d turn %d" % (i, turn))
+                if(fits):
+                    board.Piece.x, board.Piece.rotation = columns[i], rotation
+                    game.apply(HARD_DROP)
+            self.assert_same(batch, games, "after turn %d" % turn)
+            self.sync_queues(batch, games)
+            if(not batch.active.any()):
+                break
+        self.assertGreater(sum(game.pieces_placed for game in games), 200)
+
+if __name__ == "__main__":
+    unittest.main()
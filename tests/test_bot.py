@@ -0,0 +1,35 @@
+# the bot's plans have to end at the placement its search scored
+
+import random, unittest
+
+from boards import BOARDS
+from bot import Bot
+from engine import Game, HARD_DROP
+from runner import random_policy
+
+class PlanTest(unittest.TestCase):
+    # plays the bot's plans with every third piece placed at random, so the top of the stack gets
+    # crowded and a piece can be in the way of its own turns
+    def test_plans_reach_the_searched_placement(self):
+        for name, board in BOARDS.items():
+            for seed in range(0, 3):
+                game = Game(seed, board=board)
+                bot = Bot(time_budget_ms=None)
+                rng = random.Random(seed)
+                while(game.active and game.pieces_placed < 60):
+                    if(game.pieces_placed % 3 == 2):
+                        for action in random_policy(game, rng):
+                            game.apply(action)
+                        continue
+                    first = bot.search(game)
+                    actions = bot.actions(game)
+                    for action in actions[:-1]:
+                        game.apply(action)
+                    if(first != None):
+                        piece = game.board.Piece
+                        self.assertEqual((piece.x, piece.rotation), (first[2], first[3]),
+                                         "%s seed %d piece %d" % (name, seed, game.pieces_placed))
+                    game.apply(HARD_DROP)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# rules of the headless engine, checked on every playfield backend
+
+import unittest
+
+from boards import BOARDS
+from engine import Game, T_PIECE, ROTATE_CW, ROTATE_CCW
+
+class TSpinTest(unittest.TestCase):
+    # a T in rotation 2 at (x, y) that rotated into place, on an empty board of backend
+    def placed_t(self, board_class, x, y):
+        board = board_class(20, 10)
+        board.create_piece(T_PIECE)
+        board.Piece.x, board.Piece.y, board.Piece.rotation = x, y, 2
+        board.rotated = True
+        return board
+
+    # corners above the top row are open, they must not wrap around to the bottom row
+    def test_corners_above_the_playfield_are_open(self):
+        for name, board_class in BOARDS.items():
+            board = self.placed_t(board_class, 3, -1)
+            # both lower corners, and the cells the upper corners would wrap around to
+            for row, column in [(1, 3), (1, 5), (19, 3), (19, 5)]:
+                board.playfield[row][column] = 1
+            self.assertFalse(board.is_tspin(), name)
+
+    def test_three_blocked_corners(self):
+        for name, board_class in BOARDS.items():
+            board = self.placed_t(board_class, 3, 16)
+            board.playfield[16][3] = board.playfield[18][3] = board.playfield[18][5] = 1
+            self.assertTrue(board.is_tspin(), name)
+            board.playfield[16][3] = 0
+            self.assertFalse(board.is_tspin(), name)
+
+    # the floor counts as blocked
+    def test_floor_blocks(self):
+        for name, board_class in BOARDS.items():
+            board = self.placed_t(board_class, 3, 18)
+            board.playfield[18][3] = 1
+            self.assertTrue(board.is_tspin(), name)
+
+class LockDelayTest(unittest.TestCase):
+    # turning the O doesn't change it, so it can't be used to put off locking
+    def test_o_piece_does_not_reset_the_lock_delay(self):
+        for name, board_class in BOARDS.items():
+            game = Game(0, board=board_class)
+            # type 6 is the O piece
+            game.board.create_piece(6)
+            game.board.Piece.y = game.board.lowest_possible()
+            game.step()
+            game.step()
+            timer = game.lock_timer
+            self.assertGreater(timer, 0, name)
+            for action in [ROTATE_CW, ROTATE_CCW]:
+                self.assertEqual(game.apply(action), [], name)
+            self.assertEqual((game.lock_timer, game.lock_resets), (timer, 0), name)
+
+if __name__ == "__main__":
+    unittest.main()
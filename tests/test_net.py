@@ -0,0 +1,150 @@
+# versus mode has to survive broken or hostile players: the relay drops clients that send
+# something other than the messages it expects, and a client stops showing such a player's game
+
+import asyncio, json, unittest
+
+import replay
+from engine import Game
+from net import Relay, Versus, HOST, MAX_CATCH_UP_TICKS, encode_message
+
+# how long a test waits for the relay to answer
+TIMEOUT = 5
+
+# hello of a new game with the given seed
+def hello(seed, room="room"):
+    header = replay.make_header(Game(seed))
+    header["room"] = room
+    return {"hello": header}
+
+# messages that parse as json but aren't a hello or update either side can use
+MALFORMED = [
+    3,
+    [],
+    "hello",
+    {"hello": 5},
+    {"hello": {"room": []}},
+    # hellos without the settings of the game, or with ones it can't run on
+    {"hello": {"room": "room"}},
+    {"hello": dict(hello(0)["hello"], height=10 ** 6)},
+    {"hello": dict(hello(0)["hello"], gravity_ms=0)},
+    {"hello": dict(hello(0)["hello"], seed="0")},
+    # updates without a tick or log, or with garbage that isn't a number of lines
+    {"tick": 3},
+    {"log": ""},
+    {"tick": "3", "log": ""},
+    {"tick": -1, "log": ""},
+    {"tick": 3, "log": 5},
+    {"tick": 3, "log": "", "attack": "x"},
+    {"tick": 3, "log": "", "attack": -2},
+    {"tick": 3, "log": "", "attack": True}
+]
+
+class RelayTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.relay = Relay()
+        self.server = await asyncio.start_server(self.relay.handle, HOST, 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    # connects a player that says hello in room, returns its reader, writer and id
+    async def join(self, room):
+        reader, writer = await asyncio.open_connection(HOST, self.port)
+        writer.write(encode_message(hello(0, room)))
+        while(True):
+            message = await self.read(reader)
+            if("welcome" in message):
+                return reader, writer, message["welcome"]
+
+    async def read(self, reader):
+        return json.loads(await asyncio.wait_for(reader.readline(), TIMEOUT))
+
+    async def test_malformed_messages_drop_the_peer(self):
+        reader, writer, _ = await self.join("room")
+        for line in [encode_message(message) for message in MALFORMED] + [b"not json\n"]:
+            # a peer that is dropped before joining a room
+            bad_reader, bad_writer = await asyncio.open_connection(HOST, self.port)
+            bad_writer.write(line)
+            self.assertEqual(await asyncio.wait_for(bad_reader.read(), TIMEOUT), b"", line)
+            bad_writer.close()
+            # and one that is dropped after joining, the others are told it left
+            bad_reader, bad_writer, bad_id = await self.join("room")
+            self.assertEqual((await self.read(reader))["from"], bad_id)
+            bad_writer.write(line)
+            self.assertEqual(await asyncio.wait_for(bad_reader.read(), TIMEOUT), b"", line)
+            self.assertEqual(await self.read(reader), {"from": bad_id, "bye": True})
+            bad_writer.close()
+        # the relay still passes messages on
+        _, other_writer, other_id = await self.join("room")
+        self.assertEqual((await self.read(reader))["from"], other_id)
+        other_writer.write(encode_message({"tick": 1, "log": ""}))
+        self.assertEqual(await self.read(reader), {"tick": 1, "log": "", "from": other_id})
+        other_writer.close()
+        writer.close()
+
+# stands in for NetClient, messages put in incoming are received on the next update
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+        self.incoming = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def poll(self):
+        messages = self.incoming
+        self.incoming = []
+        return messages
+
+class VersusTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.versus = Versus(self.client)
+        self.versus.start(Game(0))
+
+    # delivers messages from the other player with id 2 and runs one update
+    def receive(self, *messages):
+        for message in messages:
+            if(isinstance(message, dict)):
+                message = dict(message, **{"from": 2})
+            self.client.incoming.append(message)
+        self.versus.update()
+
+    # broken messages, whether the relay let them through or not, drop the player that sent them
+    def test_malformed_messages_drop_the_opponent(self):
+        broken = MALFORMED + [
+            # tokens that aren't actions
+            {"tick": 3, "log": "zz"},
+            {"tick": 3, "log": "3Q"},
+            # actions after the update's own tick
+            {"tick": 3, "log": "5L"}
+        ]
+        for message in broken:
+            self.receive(hello(1))
+            self.assertEqual(list(self.versus.opponents), [2])
+            self.receive(message)
+            if(isinstance(message, dict)):
+                self.assertEqual(self.versus.opponents, {}, message)
+        self.assertEqual(self.versus.error, None)
+
+    def test_updates_are_re_simulated(self):
+        self.receive(hello(1), {"tick": 5, "log": "3L 1A", "attack": 2})
+        game = self.versus.games()[0]
+        self.assertEqual(game.ticks, 5)
+        self.assertEqual(self.versus.session.incoming, 2)
+        # actions from before the tick the game was re-simulated to
+        self.receive({"tick": 6, "log": "0R"})
+        self.assertEqual(self.versus.opponents, {})
+
+    # a game far ahead is caught up on over several updates, not all at once
+    def test_catch_up_is_limited_per_update(self):
+        self.receive(hello(1), {"tick": 10 ** 9, "log": ""})
+        game = self.versus.games()[0]
+        self.assertEqual(game.ticks, MAX_CATCH_UP_TICKS)
+        self.receive()
+        self.assertEqual(game.ticks, 2 * MAX_CATCH_UP_TICKS)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+# the renderer's two ways of drawing a frame have to agree: render only redraws what changed,
+# full_redraw draws everything, the same game state has to look the same either way
+
+import os, random, unittest
+from unittest import mock
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+import fonts
+from engine import Game
+from renderer import Renderer, Layout
+from runner import random_policy
+
+# the timer shows the same time in every frame, so frames can be compared
+FROZEN_TIME = mock.Mock(return_value=1000.0)
+
+class RenderTest(unittest.TestCase):
+    def setUp(self):
+        pygame.display.init()
+        pygame.font.init()
+        fonts.load_fonts()
+
+    def tearDown(self):
+        pygame.quit()
+
+    # plays a game with the random policy, comparing the frame render draws with the one
+    # full_redraw draws after every step
+    def play_and_compare(self, seed, height=20, width=10, scale=30):
+        layout = Layout(height, width, scale)
+        pygame.display.set_mode(layout.screen_size)
+        game = Game(seed, height, width)
+        rng = random.Random(seed)
+        with mock.patch("renderer.time.time", FROZEN_TIME):
+            rendered = Renderer(pygame.Surface(layout.screen_size).convert(), scale)
+            redrawn = Renderer(pygame.Surface(layout.screen_size).convert(), scale)
+            rendered.set_session(game)
+            redrawn.set_session(game)
+            rendered.full_redraw(True)
+            plan = []
+            for step in range(0, 1500):
+                if(not game.active):
+                    break
+                if(len(plan) == 0):
+                    plan = random_policy(game, rng)
+                game.step(plan.pop(0) if step % 4 == 0 else None)
+                if(not game.active):
+                    break
+                rendered.render()
+                redrawn.full_redraw(True)
+                self.assertEqual(pygame.image.tostring(rendered.screen, "RGB"),
+                                 pygame.image.tostring(redrawn.screen, "RGB"),
+                                 "frames differ after step %d" % step)
+            self.assertGreater(game.pieces_placed, 10)
+
+    def test_render_matches_full_redraw(self):
+        for seed in range(0, 3):
+            self.play_and_compare(seed)
+
+    def test_render_matches_full_redraw_other_sizes(self):
+        self.play_and_compare(7, 12, 16, scale=20)
+        self.play_and_compare(8, 24, 6, scale=24)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,303 +7,29 @@
 # https://www.youtube.com/watch?v=zfvxp7PgQ6c
 # Sound effects from the game NullPomino
 
-import pygame, random, time
-
-# make sure pieces.py is in same directory for this to work
-from pieces import Piece
-
-# main class for game functionality, piece manipulation, and board features
-class Tetris:
-    # track user lines cleared
-    lines_cleared = 0
-    # default piece type is none
-    Piece = None
-    # where the board is displayed on the screen, offset from top left
-    x = 60
-    y = 60
-    # initialize by generating blank playfield
-    def __init__(self, height, width):
-        # game starts out as active, becomes deactive upon playe6 loss
-        self.active = True
-        # playfield stores the entire tetris board
-        self.playfield = []
-        self.height = height
-        self.width = width
-        for _ in range(height):
-            row = []
-            for _ in range(width):
-                row.append(0)
-            self.playfield.append(row)
-
-    # generates piece at top of the screen, check Piece class in pieces.py
-    def create_piece(self, piece_type):
-        self.Piece = Piece(3, 0, piece_type)
-
-    # rotate piece, check Piece class in pieces.py
-    def rotate(self, direction):
-        self.Piece.rotate(direction)
-        # check for collision to make sure rotation is possible
-        if(self.check_collision()):
-            self.Piece.rotate(-direction)
-
-    # check piece collision
-    def check_collision(self):
-        # range is 4 since piece shapes are stored as numbers from 1-16
-        for i in range(0, 4):
-            for j in range(0, 4):
-                # i * 4 + j is position (j, i), check if it's in piece shape
-                if(i * 4 + j in self.Piece.return_positions()):
-                    # collision with outside wall
-                    if(i + self.Piece.y > self.height - 1 or j + self.Piece.x > self.width - 1):
-                        return True
-                    # collision with another piece in the playfield
-                    if(j + self.Piece.x < 0 or self.playfield[i + self.Piece.y][j + self.Piece.x] > 0):
-                        return True
-        # since no collisions detected, return false
-        return False
-
-    # when user presses space, hard drop to bottom of screen and lock
-    def hard_drop(self):
-        # go to lowest point without collision
-        while(not self.check_collision()):
-            self.Piece.y += 1
-        self.Piece.y -= 1
-        self.lock()
-
-    # returns lowest point of piece to help draw ghost note
-    def lowest_possible(self):
-        # keep track of original position since the piece doesn't actually move
-        original_y = self.Piece.y
-        while(not self.check_collision()):
-            self.Piece.y += 1
-        self.Piece.y -= 1
-        # return lowest position, return piece to original position
-        lowest_y = self.Piece.y
-        self.Piece.y = original_y
-        return lowest_y
-
-    # when user presses space or when natural gravity takes place, move one square down
-    def soft_drop(self):
-        self.Piece.y += 1
-        # if collides, then lock piece
-        if(self.check_collision()):
-            self.Piece.y -= 1
-            self.lock()
-
-    # locks piece, adds to playfield, clears lines
-    def lock(self):
-        # add piece shape to playfield
-        for i in range(0, 4):
-            for j in range(0, 4):
-                if(i * 4 + j in self.Piece.return_positions()):
-                    self.playfield[i + self.Piece.y][j + self.Piece.x] = self.Piece.type + 1
-        self.clear_lines()
-        game.Piece = None
-        # play drop sound effect
-        sound_effect = pygame.mixer.Sound('audio/drop.wav')
-        sound_effect.play()
-
-    # when player presses left or right arrow
-    def horizontal_move(self, direction):
-        # attempt to move in direction
-        self.Piece.x += direction
-        # if collision, return to original spot
-        if(self.check_collision()):
-            self.Piece.x -= direction
-        # play move sound effect
-        else:
-            sound_effect = pygame.mixer.Sound('audio/move.wav')
-            sound_effect.play()
-
-    # once all ten pieces are filled in a row, it disappears and the other rows move down
-    def clear_lines(self):
-        # track how many lines are cleared
-        lines = 0
-        for row in range(1, self.height):
-            # if there are no empty spaces, clear the line
-            if(self.playfield[row].count(0) == 0):
-                lines += 1
-                # move all rows above down by one
-                for above in range(row, 1, -1):
-                    for j in range(0, self.width):
-                        self.playfield[above][j] = self.playfield[above - 1][j]
-        # if line was cleared, play sound effect
-        if(lines > 0):
-            self.lines_cleared += lines
-            sound_effect = pygame.mixer.Sound('audio/clear.wav')
-            sound_effect.play()
-
-# draws playfield grid
-def draw_grid():
-    # vertical lines
-    for i in range(0, game.width + 1):
-        pygame.draw.line(screen, DARK_GREY, (game.x + scale * i + 1, game.y + 1),
-                                            (game.x + scale * i + 1, game.y + scale*game.height), 1)
-    # horizontal lines
-    for j in range(0, game.height + 1):
-        pygame.draw.line(screen, DARK_GREY, (game.x + 1, game.y + scale * j + 1),
-                                            (game.x + scale*game.width, game.y + scale * j + 1), 1)
-
-# draws border around playfield
-def draw_border():
-    # draw playfield border
-    # horizontal lines
-    for offset in [0, scale * game.width]:
-        pygame.draw.line(screen, LIGHT_GREY, (game.x + offset + 1, game.y + 1),
-                                             (game.x + offset + 1, game.y + scale*game.height), 2)
-    # vertical lines
-    for offset in [0, scale * game.height]:
-        pygame.draw.line(screen, LIGHT_GREY, (game.x + 1, game.y + offset + 1),
-                                             (game.x + scale*game.width, game.y + offset + 1), 2)
-    # draw next piece border and hold piece border
-    # horizontal lines
-    for v_offset in [0, scale*7]:
-        for offset in [0, 180]:
-            pygame.draw.line(screen, LIGHT_GREY, (game.x + scale * game.width + offset + 30, game.y + v_offset + 1),
-                                                 (game.x + scale * game.width + offset + 30, game.y + v_offset + scale*4 + 1), 2)
-        # vertical lines
-        for offset in [0, scale*4]:
-            pygame.draw.line(screen, LIGHT_GREY, (game.x + scale*game.width + 30, game.y + v_offset + offset + 1),
-                                                 (game.x + scale*game.width + 210, game.y + v_offset + offset + 1), 2)
-
-# draw current piece and ghost piece onto the screen
-def draw_current_piece():
-    lowest_possible = game.lowest_possible()
-    # draw using every rectangle of the shape
-    for i in range(0, 4):
-        for j in range(0, 4):
-            p = i * 4 + j
-            # if the position is in the shape
-            if(p in game.Piece.return_positions()):
-                # draw ghost piece, which is darker than the actual piece
-                pygame.draw.rect(screen, (PIECE_COLOURS[game.Piece.type + 1][0]/2,
-                                          PIECE_COLOURS[game.Piece.type + 1][1]/2,
-                                          PIECE_COLOURS[game.Piece.type + 1][2]/2),
-                                 [game.x + scale * (j + game.Piece.x) + 1,
-                                  game.y + scale * (i + lowest_possible) + 1,
-                                  scale, scale])
-                # draw current piece
-                pygame.draw.rect(screen, PIECE_COLOURS[game.Piece.type + 1],
-                                 [game.x + scale * (j + game.Piece.x) + 1,
-                                  game.y + scale * (i + game.Piece.y) + 1,
-                                  scale, scale])
-                    
-# draw full playfield
-def draw_playfield():
-    for i in range(0, game.height):
-        for j in range(0, game.width):
-            # if game.playfield > 0, then there is a piece there
-            if(game.playfield[i][j] > 0):
-                # playfield has colour information (bound to piece type)
-                pygame.draw.rect(screen, PIECE_COLOURS[game.playfield[i][j]],
-                    [game.x + scale * j + 1, game.y + scale * i + 1, scale, scale])
-
-# draw next piece preview
-def draw_next_piece():
-    global piece_list
-    # next piece is at piece_number position, since the current piece is actually piece_number - 1
-    next_piece = Piece.pieces[piece_list[piece_number]]
-    # draw next piece
-    for i in range(0, 4):
-        for j in range(0, 4):
-            p = i * 4 + j
-            # next_piece[0] is the default rotation of the piece
-            if(p in next_piece[0]):
-                # use piece colour based on type
-                pygame.draw.rect(screen, PIECE_COLOURS[piece_list[piece_number] + 1],
-                    [game.x + scale * (j + 12),
-                    game.y + scale * (i + 1),
-                    scale, scale])
-
-# draws hold piece, can be nothing
-def draw_hold_piece():
-    global piece_list, hold_piece
-    if(hold_piece != None):
-        # draw hold piece
-        for i in range(0, 4):
-            for j in range(0, 4):
-                p = i * 4 + j
-                # the default rotation of the piece
-                if(p in Piece.pieces[hold_piece][0]):
-                    # use piece colour based on type
-                    pygame.draw.rect(screen, PIECE_COLOURS[hold_piece + 1],
-                        [game.x + scale * (j + 12),
-                        game.y + scale * (i + 8),
-                        scale, scale])
-
-# draws title, next piece, hold piece, stats
-def draw_text():
-    # set font
-    main_font = pygame.font.SysFont('myanmartext', 25, True, False)
-    # have to render first then blit in pygame
-    title_text = main_font.render("Max's Tetris Game", True, WHITE)
-    next_text = main_font.render("Next Piece", True, WHITE)
-    hold_text = main_font.render("Hold Piece", True, WHITE)
-
-    # draw some statistics, elapsed time is rounded to 2 significant figures
-    elapsed_time = main_font.render("Time: " + str(round(time.time() - time_start, 2)), True, WHITE)
-    lines_cleared = main_font.render("Lines: " + str(game.lines_cleared), True, WHITE)
-    pieces_placed = main_font.render("Pieces: " + str(total_pieces), True, WHITE)
-    
-    # blit based on scale
-    screen.blit(next_text, (game.x + scale * game.width + 56, game.y + scale*4 + 5))
-    screen.blit(hold_text, (game.x + scale * game.width + 56, game.y + scale*11 + 5))
-    screen.blit(title_text, (200, 20))
-    screen.blit(elapsed_time, (70, game.y + scale*20 + 5))
-    screen.blit(lines_cleared, (70, game.y + scale*21 + 5))
-    screen.blit(pieces_placed, (70, game.y + scale*22 + 5))
-
-# displays message at the center of the screen
-def display_message(message, y, bold):
-    if(bold):
-        font = pygame.font.SysFont("Source Code Pro", 60)
-    else:
-        font = pygame.font.SysFont("myanmartext", 30)
-    display_text = font.render(message, 1, WHITE)
-    display_position = display_text.get_rect(center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2 + y))
-    screen.blit(display_text, display_position)
-
-# draws
-def draw_rectangle():
-    # size of rectangle
-    rectangle_surface = pygame.Surface((9*SCREEN_WIDTH/10, 3*SCREEN_HEIGHT/10))
-    # transparency
-    rectangle_surface.set_alpha(220)
-    # fill entire surface
-    rectangle_surface.fill((0,0,0))
-    # defined using top left coordinates
-    screen.blit(rectangle_surface, (SCREEN_WIDTH/20, 3.5*SCREEN_HEIGHT/10))
-    # defined using top left coordinates and height/width
-    pygame.draw.rect(screen, (200,200,200), pygame.Rect(SCREEN_WIDTH/20, 3.5*SCREEN_HEIGHT/10,
-                                                        9*SCREEN_WIDTH/10, 3*SCREEN_HEIGHT/10), 5)
-
-# draws at the beginning of each game, instructions
-def draw_start_text():
-    display_message("Pygame Tetris!", -70, True)
-    display_message("Arrow keys to move, space to drop.", -22, False)
-    display_message("A/S to rotate, C to hold.", 10, False)
-    display_message("Clear 40 lines to win.", 42, False)
-    display_message("Press any key to begin.", 74, False)
-
-# draws at game over (player wins or loses)
-def draw_end_text():
-    display_message("Game Over!", -20, True)
-    display_message("Press R to restart.", 25, False)
-
-# draws all parts of the game, piece_active is false when intializing the game
-def full_redraw(piece_active):
-    screen.fill((10,10,20))
-    if(piece_active):
-        draw_current_piece()
-    draw_playfield()
-    draw_grid()
-    draw_border()
-    draw_next_piece()
-    draw_hold_piece()
-    draw_text()
-
-# waits for user to press a key before continuing
-def wait_for_input(key = "any"):
+import time
+# when the program started, the time to the first frame includes importing pygame
+STARTED = time.perf_counter()
+
+import argparse, os, pygame, random, signal, sys
+
+# make sure engine.py and renderer.py are in same directory for this to work
+import fonts, net, replay
+from boards import BOARDS
+from audio import load_sound_bank, SilentSoundBank
+from controls import Controls, DAS_MS, ARR_MS, SDF
+from bot import Bot
+from profiler import Profiler
+from renderer import Renderer, HeadlessRenderer, Layout, BoardView, TileAtlas, SCALE, PIECE_COLOURS, BACKGROUND
+from engine import Game, RESIGN, TICK_MS
+from startup import Preloader, StartupTimer
+
+# milliseconds between checks for a keypress on the start and end screens, waiting instead of
+# spinning leaves the CPU to the thread loading the fonts and sounds
+INPUT_POLL_MS = 10
+
+# waits for user to press a key before continuing, calls idle between checks if it is given
+def wait_for_input(key = "any", idle = None):
     pause = True
     while(pause):
         for event in pygame.event.get():
@@ -312,192 +38,344 @@ def wait_for_input(key = "any"):
             elif(event.type == pygame.KEYDOWN):
                 if(key == "any" or event.key == ord(key)):
                     return
-
-# initialize the game engine
-pygame.init()
-
-# define colours
-PIECE_COLOURS = [
-    (0, 0, 0),
-    (15, 155, 215),
-    (33, 65, 198),
-    (227, 91, 2),
-    (89, 177, 1),
-    (215, 15, 55),
-    (175, 41, 138),
-    (227, 159, 2)
-]
-WHITE = (255, 255, 255)
-DARK_GREY = (50, 50, 50)
-LIGHT_GREY = (150, 150, 150)
-
-# fixed screen height and width
-SCREEN_WIDTH = 640
-SCREEN_HEIGHT = 800
-
-# everything gets rendered to screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-scale = 30
-
-# sets window caption
-pygame.display.set_caption("Tetris")
-# sets window icon
-icon = pygame.image.load("icon.png")
-pygame.display.set_icon(icon)
-
-# loop until the user clicks the close button
-user_exit = False
-
-while(user_exit == False):
-    # starts the main game, 20x10 by default. Other sizes may be buggy.
-    game = Tetris(20, 10)
-    # tracks game time for gravity
-    counter = 0
-    # tracks how long the player has held down, for soft drop
-    down_counter = -1
-    down_pressed = False
-    # tracks piece number for bagged randomness
-    piece_number = 0
-    # tracks total number of pieces placed
-    total_pieces = 0
-    # instead of generating random pieces, all seven pieces are given in a random order
-    piece_list = list(range(0, 7))
-    random.shuffle(piece_list)
-    # also keep track of the next bag so that next piece preview always works
-    next_piece_list = list(range(0, 7))
-    random.shuffle(next_piece_list)
-    # track whether or not hold was used and what the hold piece was
-    hold_used = False
-    hold_piece = None
-    
-    # keep track of time
-    time_start = time.time()
-    # draw everything initially, the "false" is to not draw the current piece, which doesn't exist
-    full_redraw(False)
-    # start screen with instructions
-    draw_rectangle()
-    draw_start_text()
+        if(idle != None):
+            idle()
+        pygame.time.wait(INPUT_POLL_MS)
+
+# set by ctrl-c in headless games, which have no window to close
+interrupted = False
+
+# ctrl-c handler for headless games
+def interrupt(signum, frame):
+    global interrupted
+    interrupted = True
+
+# pygame events since the last call, headless games only get a quit after ctrl-c
+def get_events(headless):
+    if(not headless):
+        return pygame.event.get()
+    if(interrupted):
+        return [pygame.event.Event(pygame.QUIT)]
+    return []
+
+# draws the start screen with the instructions
+def draw_start_screen(renderer):
+    # draw everything initially, the "false" is to not draw the current piece
+    renderer.full_redraw(False)
+    renderer.draw_rectangle()
+    renderer.draw_start_text()
     pygame.display.update()
-    # wait for any key as input to begin playing
-    user_input = wait_for_input()
-    if(user_input == "exit"):
-        user_exit = True
-    # reset timer
-    time_start = time.time()
 
-    # main game loop
-    while(game.active):
-        # if there is no piece, generate one
-        if(game.Piece == None):
-            game.create_piece(piece_list[piece_number])
-            piece_number += 1
-            # if the end of the scrambled bag is reached
-            if(piece_number == 7):
-                # replace current bag with next bag and scramble next bag
-                piece_list = next_piece_list
-                random.shuffle(next_piece_list)
-                piece_number = 0
-            # player is allowed to hold again (can hold once per piece)
-            hold_used = False
-            # if there is a collision, player loses, if player clears 40 lines player wins
-            if(game.check_collision() or game.lines_cleared > 39):
-                # need to redraw text to increase piece_number accurately
-                full_redraw(False)
-                game.active = False
-                # play game over sound effect
-                sound_effect = pygame.mixer.Sound("audio/gameover.wav")
-                sound_effect.play()
-                # break out of while loop since game has ended
-                break
-        counter += 1
-        # every 180 ticks drop the piece due to gravity, or drop from down being pressed
-        if(counter % 180 == 0 or (down_pressed and down_counter % 40 == 0)):
-            game.soft_drop()
-        # track how long user has held down
-        if(down_counter != -1):
-            down_counter += 1
-        
-        for event in pygame.event.get():
-            if(event.type == pygame.QUIT):
+# while the start screen is up, draws it again with its text as soon as the fonts have loaded
+def draw_text_when_loaded(renderer, preloader):
+    if(not renderer.show_text and preloader.done("fonts")):
+        renderer.set_text(True)
+        draw_start_screen(renderer)
+
+# the screen is redrawn at most FPS times per second, the simulation runs at its own fixed rate
+FPS = 60
+# most simulation time caught up in one frame, so a stall doesn't fast-forward the game
+MAX_FRAME_MS = 250
+# the bot applies one of its planned actions every BOT_ACTION_MS
+BOT_ACTION_MS = 50
+# in versus games the boards of up to MAX_OPPONENTS other players are shown to the right,
+# with cells OPPONENT_SCALE times smaller
+MAX_OPPONENTS = 3
+OPPONENT_SCALE = 3
+OPPONENT_GAP = 20
+
+# draws the boards of the other players of a versus game next to the game at x, returns the
+# regions that changed
+def draw_opponents(screen, versus, views, x, y):
+    dirty = []
+    games = versus.games()
+    for k, view in enumerate(views):
+        position = (x + k * (view.surface.get_width() + OPPONENT_GAP), y)
+        if(k < len(games)):
+            if(view.draw(games[k])):
+                dirty.append(screen.blit(view.surface, position))
+        elif(view.drawn_game != None):
+            # the player left
+            view.drawn_game = None
+            dirty.append(screen.fill(BACKGROUND, pygame.Rect(position, view.surface.get_size())))
+    return dirty
+
+# opens the window and runs games until the user closes it
+def main():
+    parser = argparse.ArgumentParser(description="Pygame Tetris.")
+    parser.add_argument("--board", choices=sorted(BOARDS), default="list",
+                        help="playfield backend, they all play the same")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the piece bag")
+    parser.add_argument("--height", type=int, default=20, help="rows of the playfield")
+    parser.add_argument("--width", type=int, default=10, help="columns of the playfield")
+    parser.add_argument("--scale", type=int, default=SCALE, help="size of a cell in pixels")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="save a replay of every game to DIR")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="watch a recorded game at real speed")
+    parser.add_argument("--bot", action="store_true", help="watch the bot play")
+    parser.add_argument("--das", type=float, default=DAS_MS,
+                        help="milliseconds left or right is held before it repeats")
+    parser.add_argument("--arr", type=float, default=ARR_MS,
+                        help="milliseconds between repeats, 0 moves straight to the wall")
+    parser.add_argument("--sdf", type=float, default=SDF,
+                        help="soft drop speed as a multiple of gravity, inf drops instantly (20G)")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="profile every frame and write a chrome trace to FILE on exit")
+    parser.add_argument("--connect", metavar="HOST:PORT", default=None,
+                        help="play versus everyone on a relay started with net.py")
+    parser.add_argument("--room", default=net.ROOM, help="room to join on the relay")
+    parser.add_argument("--headless", action="store_true",
+                        help="play without a window or sound, for the bot, replays and versus bots")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long startup took up to the first frame on exit")
+    args = parser.parse_args()
+    if(args.connect != None and args.replay != None):
+        parser.error("replays can't be watched in versus games")
+    if(args.headless and not args.bot and args.replay == None):
+        parser.error("headless games need --bot or --replay, there is no keyboard")
+    board = BOARDS[args.board]
+    if(args.height < 4 or args.width < 4):
+        parser.error("the playfield must be at least 4x4")
+    # replays are played on the board size they were recorded on
+    if(args.replay != None):
+        header, log = replay.load(args.replay)
+        args.height, args.width = header["height"], header["width"]
+
+    startup = StartupTimer(STARTED)
+    startup.mark("imports")
+    versus = None
+    if(args.connect != None):
+        host, _, port = args.connect.rpartition(":")
+        versus = net.Versus(net.NetClient(host or net.HOST, int(port)), args.room, board)
+    # boards of the other players in versus games, drawn right of the game
+    opponents = []
+    sounds = SilentSoundBank()
+    if(args.headless):
+        # no display, fonts or mixer are started at all
+        screen = None
+        renderer = HeadlessRenderer()
+        preloader = Preloader([])
+        signal.signal(signal.SIGINT, interrupt)
+    else:
+        # only start the parts of pygame that are used, pygame.init would also open the audio
+        # device and look for joysticks before the window could open
+        pygame.display.init()
+        pygame.font.init()
+        # look up every font once, instead of on every frame, and decode every sound effect
+        # once, instead of on every event, while the start screen is already up
+        preloader = Preloader([("fonts", fonts.load_fonts), ("sounds", load_sound_bank)])
+        startup.mark("pygame")
+        # everything gets rendered to screen, which is sized to fit the board
+        layout = Layout(args.height, args.width, args.scale)
+        width, height = layout.screen_size
+        if(versus != None):
+            opponent_scale = max(1, args.scale // OPPONENT_SCALE)
+            width += MAX_OPPONENTS * (opponent_scale * args.width + OPPONENT_GAP)
+        screen = pygame.display.set_mode((width, height))
+        # sets window caption
+        pygame.display.set_caption("Tetris")
+        # sets window icon
+        icon = pygame.image.load("icon.png")
+        pygame.display.set_icon(icon)
+        startup.mark("window")
+        # text is drawn once the fonts have loaded
+        renderer = Renderer(screen, args.scale, preloader.done("fonts"))
+        if(versus != None):
+            atlas = TileAtlas(PIECE_COLOURS, opponent_scale)
+            opponents = [BoardView(args.height, args.width, atlas) for _ in range(0, MAX_OPPONENTS)]
+    bot = Bot() if args.bot else None
+    controls = Controls(args.das, args.arr, args.sdf)
+    # F3 shows the frame profiler
+    profiler = Profiler(args.trace)
+
+    # loop until the user clicks the close button
+    user_exit = False
+    # games started so far, keeps replays of games that end in the same second apart
+    games_started = 0
+
+    while(user_exit == False):
+        # starts the main game, 20x10 by default
+        player = None
+        games_started += 1
+        if(args.replay != None):
+            # the recorded actions drive the game instead of the keyboard
+            player = replay.Player(header, log, board)
+            session = player.game
+        else:
+            # every game needs a known seed so it can be replayed
+            seed = args.seed if args.seed != None else random.randrange(2**32)
+            session = Game(seed, args.height, args.width, board)
+            if(args.record != None):
+                session.record()
+            if(versus != None):
+                versus.start(session)
+        game = session.board
+        renderer.set_session(session)
+        profiler.attach(session, renderer)
+        # keys held in the last game don't carry over
+        controls.reset()
+        # actions the bot planned for the current piece, and the piece they were planned for
+        plan = []
+        planned_piece = -1
+        bot_timer = 0
+
+        if(args.headless):
+            # headless games start right away, their first frame is the first step
+            startup.first_frame()
+        else:
+            # start screen with instructions
+            draw_start_screen(renderer)
+            startup.first_frame()
+            # wait for any key as input to begin playing
+            user_input = wait_for_input(idle=lambda: draw_text_when_loaded(renderer, preloader))
+            if(user_input == "exit"):
                 user_exit = True
-                break
-            # check the user's keypresses
-            elif(event.type == pygame.KEYDOWN):
-                if(game.Piece != None):
-                    # clockwise rotation
-                    if(event.key == ord('a')):
-                        game.rotate(1)
-                    # counterclockwise rotation
-                    elif(event.key == ord('s')):
-                        game.rotate(-1)
-                    # hold piece
-                    elif(event.key == ord('c')):
-                        # if hold hasn't been used before that turn
-                        if(not hold_used):
-                            hold_used = True
-                            # if there is no piece held
-                            if(hold_piece == None):
-                                # hold piece becomes the current piece
-                                hold_piece = game.Piece.type
-                                # create the piece which comes after
-                                game.create_piece(piece_list[piece_number])
-                                piece_number += 1
-                                if(piece_number == 7):
-                                    random.shuffle(next_piece_list)
-                                    piece_number = 0
-                                    piece_list = next_piece_list
-                            # if there is a piece held, simply swap the pieces
-                            else:
-                                hold_piece_temp = hold_piece
-                                hold_piece = game.Piece.type
-                                game.create_piece(hold_piece_temp)
-                            # play hold sound effect
-                            sound_effect = pygame.mixer.Sound('audio/hold.wav')
-                            sound_effect.play()
-                    # move piece left
-                    elif(event.key == pygame.K_LEFT):
-                        game.horizontal_move(-1)
-                    # move piece right
-                    elif(event.key == pygame.K_RIGHT):
-                        game.horizontal_move(1)
-                    # soft drop
-                    elif(event.key == pygame.K_DOWN):
-                        down_pressed = True
-                        down_counter = 0
-                    # hard drop
-                    elif(event.key == pygame.K_SPACE):
-                        game.hard_drop()
+            # the game needs the fonts and sounds, they have almost always loaded by now
+            if(not renderer.show_text):
+                preloader.get("fonts")
+                renderer.set_text(True)
+            sounds = preloader.get("sounds")
+        # reset timer, and draw the whole game once before only updating what changes
+        renderer.time_start = time.time()
+        renderer.full_redraw(True)
+        if(not args.headless):
+            pygame.display.update()
+
+        # the simulation advances in fixed TICK_MS steps, rendering is capped by the clock
+        # time is read with perf_counter, pygame's clock needs pygame.init, which is skipped
+        clock = pygame.time.Clock()
+        accumulator = 0
+        previous_time = time.perf_counter() * 1000
+
+        # main game loop
+        while(game.active):
+            profiler.begin_frame()
+            events = []
+            now = time.perf_counter() * 1000
+            accumulator = min(accumulator + now - previous_time, MAX_FRAME_MS)
+            previous_time = now
+            # game time of this moment, the steps up to it haven't run yet
+            # every key read now is stamped with it, pygame's events don't say when they happened,
+            # so input has the resolution of a frame
+            input_time = session.time + accumulator
+            # keys for the controls, applied at the tick of their stamp once the steps before it ran
+            keys = []
+            for event in get_events(args.headless):
+                if(event.type == pygame.QUIT):
+                    user_exit = True
+                    break
+                elif(event.type == pygame.KEYDOWN and event.key == pygame.K_F3):
+                    profiler.toggle()
+                # the window was uncovered, dirty rectangles aren't enough
+                elif(event.type == pygame.VIDEOEXPOSE):
+                    renderer.full_redraw(True)
+                    for view in opponents:
+                        view.drawn_game = None
+                    pygame.display.update()
+                # stop watching a replay
+                elif(player != None):
+                    if(event.type == pygame.KEYDOWN and event.key == ord('r')):
+                        game.active = False
+                # the bot plays, the user can only reset
+                elif(bot != None):
+                    if(event.type == pygame.KEYDOWN and event.key == ord('r')):
+                        events += session.apply(RESIGN)
                 # resets game
-                if(event.key == ord('r')):
-                    game.active = False
-                    # play game over sound effect
-                    sound_effect = pygame.mixer.Sound("audio/gameover.wav")
-                    sound_effect.play()
-            elif(event.type == pygame.KEYUP):
-                # user has let go of the down key
-                if(event.key == pygame.K_DOWN):
-                    down_counter = -1
-                    down_pressed = False
-        # if user closed game
-        if(user_exit):
-            break
-        # calls all draw function
-        if(game.Piece != None):
-            full_redraw(True)
+                elif(event.type == pygame.KEYDOWN and event.key == ord('r')):
+                    events += session.apply(RESIGN)
+                # check the user's keypresses
+                elif(event.type == pygame.KEYDOWN or event.type == pygame.KEYUP):
+                    if(event.type == pygame.KEYDOWN):
+                        profiler.input()
+                    keys.append(event)
+            # if user closed game
+            if(user_exit):
+                break
+            profiler.mark("events")
+            # run as many fixed steps as real time has passed
+            while(accumulator >= TICK_MS and game.active):
+                accumulator -= TICK_MS
+                # replays apply the actions recorded for this tick
+                if(player != None):
+                    events += player.step()
+                    if(player.finished):
+                        game.active = False
+                    continue
+                # the bot plans once per piece and applies its actions one at a time
+                if(bot != None):
+                    bot_timer += TICK_MS
+                    if(bot_timer >= BOT_ACTION_MS):
+                        bot_timer -= BOT_ACTION_MS
+                        if(planned_piece != session.pieces_placed):
+                            plan = bot.actions(session)
+                            planned_piece = session.pieces_placed
+                        if(len(plan) > 0):
+                            events += session.apply(plan.pop(0))
+                    events += session.step()
+                    continue
+                # auto repeat of held keys that is due by this step
+                events += controls.update(session, session.time)
+                events += session.step()
+            # then the keys read this frame, and the repeats due by now, so they are in this frame
+            if(player == None and bot == None):
+                for event in keys:
+                    events += controls.handle(event, input_time, session)
+                events += controls.update(session, session.time + accumulator)
+            sounds.play_events(events)
+            # sends what happened and takes in the other players' moves and garbage
+            if(versus != None):
+                versus.update()
+                if(versus.error != None):
+                    print("versus: " + versus.error, file=sys.stderr)
+                    versus.error = None
+            profiler.mark("simulation")
+            # calls all draw function
+            if(game.active):
+                if(len(opponents) > 0):
+                    pygame.display.update(draw_opponents(screen, versus, opponents,
+                                                         layout.screen_width, layout.y))
+                renderer.render()
+                profiler.mark("draw")
+                # sleep until the next frame is due instead of spinning
+                clock.tick(FPS)
+                profiler.mark("sleep")
+            else:
+                # need to redraw text to show the final stats
+                renderer.full_redraw(False)
+            profiler.end_frame(screen)
+        # save the replay, also when the window was closed mid-game
+        # versus games are always recorded to be sent, but only saved when asked for
+        if(session.log != None and args.record != None):
+            os.makedirs(args.record, exist_ok=True)
+            replay.save(session, os.path.join(args.record, time.strftime("%Y%m%d-%H%M%S-")
+                                              + "%d-%d.replay" % (session.seed, games_started)))
+        # game has ended (player won/lost)
+        if(game.active == False and not user_exit and args.headless):
+            # replays are watched once, other headless games start over right away
+            user_exit = player != None
+        elif(game.active == False and not user_exit):
+            # display game over screen
+            renderer.draw_rectangle()
+            renderer.draw_end_text()
             pygame.display.update()
-        # if piece is None, that means it was placed, increase total_pieces
-        else:
-            total_pieces += 1
-    # game has ended (player won/lost)
-    if(game.active == False and not user_exit):
-        # display game over screen
-        draw_rectangle()
-        draw_end_text()
-        pygame.display.update()
-        # wait for player to press R to restart
-        user_input = wait_for_input('r')
-        if(user_input == "exit"):
-            user_exit = True
+            # wait for player to press R to restart
+            user_input = wait_for_input('r')
+            if(user_input == "exit"):
+                user_exit = True
 
-# if main while loop is quit, then exit the program
-pygame.quit()
+    # if main while loop is quit, then exit the program
+    # pygame can't be quit while the fonts and sounds are still loading
+    preloader.join()
+    if(args.startup_report):
+        print(startup.report(preloader))
+    # the startup phases go in the trace too
+    for name, start, end in startup.phases:
+        profiler.add_trace_event("startup: " + name, start, end)
+    profiler.save()
+    if(versus != None):
+        versus.client.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()